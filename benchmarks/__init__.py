@@ -0,0 +1,21 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Performance benchmarks for `kathaireo`.
+
+The :mod:`.synthetic` module generates RDF documents of any size, the
+same ones for the same parameters. :mod:`.run` times the entry points
+of the :mod:`kathaireo.rdf`, :mod:`kathaireo.commands` and
+:mod:`kathaireo.shell` packages on such documents, at several scales,
+and writes the results to a JSON file. Results of two runs, e.g. before
+and after a change, are compared by :mod:`.compare`:
+::
+
+	python -m benchmarks.run --scales 1000,10000,100000 -o before.json
+	[...]
+	python -m benchmarks.run --scales 1000,10000,100000 -o after.json
+	python -m benchmarks.compare before.json after.json
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+__all__ = ['synthetic', 'run', 'compare']
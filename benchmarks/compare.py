@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Compares the results of two benchmark runs (see :mod:`.run`).
+::
+
+	python -m benchmarks.compare [-t threshold] before.json after.json
+
+For every benchmark and scale present in both files, the fastest times
+are compared. Benchmarks which have become slower by more than the
+factor :data:`threshold` are marked as regressions, in which case the
+exit status is ``1``.
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import sys
+import json
+import getopt
+
+threshold = 1.1
+"""Factor by which a benchmark may become slower without being
+considered a regression."""
+
+
+# load results
+def load(filename):
+	"""Returns the results in a file written by :mod:`.run`, by
+	``(name, scale)``. Failed benchmarks are left out."""
+	with open(filename) as f:
+		data = json.load(f)
+	return dict([((r.get('name'), r.get('scale')), r)
+		for r in data.get('results', []) if not 'error' in r])
+
+
+# compare two runs
+def compare(before, after, threshold=threshold):
+	"""Compares the results of two runs as returned by :func:`load`.
+
+	:returns: list of tuples ``(name, scale, before, after, ratio,
+		regression)`` for benchmarks in both runs, where `before`
+		and `after` are the fastest times.
+	"""
+	res = []
+	for key, old in before.items():
+		new = after.get(key)
+		if new is None:
+			continue
+		t0, t1 = (old.get('min'), new.get('min'))
+		ratio = t1 / t0 if t0 > 0 else float('inf')
+		res.append(key + (t0, t1, ratio, ratio > threshold))
+	return sorted(res, key=lambda r: (r[1], r[0]))
+
+
+def main(argv):
+	try:
+		opts, args = getopt.getopt(argv, 't:')
+		limit = float(dict(opts).get('-t', threshold))
+		before, after = [load(f) for f in args]
+	except (getopt.GetoptError, ValueError, IOError):
+		sys.stderr.write('usage: python -m benchmarks.compare [-t threshold] '
+			'before.json after.json\n')
+		return 2
+	rows = compare(before, after, threshold=limit)
+	print('{:<14} {:>9} {:>11} {:>11} {:>8}'.format('benchmark', 'scale',
+		'before', 'after', 'ratio'))
+	for name, scale, t0, t1, ratio, slower in rows:
+		print('{:<14} {:>9} {:>10.4f}s {:>10.4f}s {:>7.2f}x{}'.format(name,
+			scale, t0, t1, ratio, ['', '  !regression!'][int(slower)]))
+	missing = set(before.keys()) ^ set(after.keys())
+	if missing:
+		print('Not in both runs: {}'.format(', '.join(
+			['{} ({})'.format(*k) for k in sorted(missing)])))
+	regressions = len([r for r in rows if r[-1]])
+	print('{} of {} benchmarks slower by more than {:.2f}x.'.format(
+		regressions, len(rows), limit))
+	return int(regressions > 0)
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
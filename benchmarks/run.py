@@ -0,0 +1,281 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Times the entry points of `kathaireo` on synthetic graphs (see
+:mod:`.synthetic`) of several sizes, and writes the results to a JSON
+file to be compared with those of another run by :mod:`.compare`.
+::
+
+	python -m benchmarks.run [-s 1000,10000] [-r repeats]
+		[-n namespaces] [-l literal ratio] [-o results.json] [benchmark ...]
+
+Every benchmark is run :data:`repeats` times per scale, each time on
+freshly prepared input, and the fastest and the median time are kept.
+The network is considered down during benchmarks, so that namespace
+vocabularies are not downloaded, and the parse cache is kept in a
+temporary directory.
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import io
+import os
+import sys
+import json
+import time
+import getopt
+import shutil
+import platform
+import tempfile
+import contextlib
+
+from kathaireo import rdf, commands
+from kathaireo.commands import handlers
+from kathaireo.rdf import storage
+from kathaireo.shell import prompt
+
+from . import synthetic
+
+scales = [1000, 10000]
+"""Default graph sizes, in number of generated statements."""
+
+repeats = 3
+"""Default number of times each benchmark is run per scale."""
+
+benchmarks = []
+"""Registered benchmarks, as ``(name, function)`` tuples. A function
+is passed a :class:`Context`, prepares its input and returns the callable
+to be timed."""
+
+# input lines completed by choices_left benchmark
+_inputs = ['', 'l', 'lo', 'load ', 'load /tm', 'find term res1',
+	'find term ns0:', 'cp ', 'cp g', 'insert ', 'use ', 'bind ', 'ls ns ',
+	'save ', 'create g store sqlite ']
+
+
+# benchmark setup state
+class Context(object):
+	"""Input of the benchmarks at one scale: a generated document
+	and the graph it has been loaded into."""
+	def __init__(self, scale, workdir, namespaces=4, literals=0.3):
+		self.scale = scale
+		self.workdir = workdir
+		self.document = synthetic.write(
+			os.path.join(workdir, 'synthetic{}.ttl'.format(scale)), scale,
+			namespaces=namespaces, literals=literals)
+		self.graphs = []
+		self.graph = self.load()
+
+	def name(self):
+		"""Returns a graph name not taken yet."""
+		name = 'bench{}_{}'.format(self.scale, len(self.graphs))
+		self.graphs.append(name)
+		return name
+
+	def load(self):
+		"""Loads the document into a new graph."""
+		return rdf.load_resource(self.document, name=self.name())
+
+	def close(self):
+		"""Forgets the graphs created."""
+		for name in self.graphs:
+			rdf._graphs.pop(name, None)
+		rdf.set_graph(None)
+
+
+# register benchmark
+def benchmark(func):
+	"""Adds `func` to :data:`benchmarks`, named after its docstring's
+	first line."""
+	benchmarks.append((func.__doc__.split('\n')[0].strip(), func))
+	return func
+
+
+@benchmark
+def bench_load(ctx):
+	"""load"""
+	rdf.cache.clear()
+	return ctx.load
+
+
+@benchmark
+def bench_load_cached(ctx):
+	"""load cached"""
+	return ctx.load
+
+
+@benchmark
+def bench_find(ctx):
+	"""find"""
+	rdf.touch(ctx.graph)
+	return lambda: list(rdf.find_term('res1', g=ctx.graph))
+
+
+@benchmark
+def bench_find_indexed(ctx):
+	"""find indexed"""
+	list(rdf.find_term('', g=ctx.graph))
+	return lambda: list(rdf.find_term('res1', g=ctx.graph))
+
+
+@benchmark
+def bench_cp(ctx):
+	"""cp"""
+	src, dst = (rdf.graph_name(ctx.graph), ctx.name())
+	return lambda: handlers.cp_graph(src, dst, graph=dst)
+
+
+@benchmark
+def bench_merge(ctx):
+	"""merge"""
+	src, dst = (rdf.graph_name(ctx.graph), ctx.name())
+	rdf.create_graph(dst)
+	return lambda: handlers.merge_graph(src, dst, graph=dst)
+
+
+@benchmark
+def bench_save_xml(ctx):
+	"""save xml"""
+	filename = os.path.join(ctx.workdir, 'dump.rdf')
+	return lambda: storage.save_xml(ctx.graph, filename)
+
+
+@benchmark
+def bench_choices_left(ctx):
+	"""choices_left"""
+	rdf.set_graph(ctx.graph)
+	def complete():
+		for line in _inputs:
+			commands.choices_left(line, (len(line)-len(line.split(' ')[-1]),
+				len(line)))
+	return complete
+
+
+@benchmark
+def bench_display(ctx):
+	"""display"""
+	lines = list(rdf.ls_rdf(ctx.graph))
+	def display():
+		settings = (prompt.highlighting, prompt.pager)
+		prompt.highlighting, prompt.pager = (True, False)
+		try:
+			with contextlib.redirect_stdout(io.StringIO()):
+				prompt.display(lines)
+		finally:
+			prompt.highlighting, prompt.pager = settings
+	return display
+
+
+# run benchmark repeatedly
+def measure(func, ctx, count):
+	"""Runs a benchmark `count` times and returns the seconds taken
+	by each run."""
+	times = []
+	for i in range(count):
+		task = func(ctx)
+		start = time.perf_counter()
+		task()
+		times.append(time.perf_counter() - start)
+	return times
+
+
+# run all benchmarks at all scales
+def run(names=None, scales=scales, repeats=repeats, namespaces=4,
+	literals=0.3, report=None):
+	"""Runs the benchmarks in :data:`benchmarks`, or those named in
+	`names`, at all `scales`.
+
+	:param report: function called with each result, e.g. for printing
+	:returns: dictionary with keys ``meta`` (parameters and versions)
+		and ``results``, a list of dictionaries with keys ``name``,
+		``scale``, ``triples`` (size of the graph loaded), ``min``,
+		``median`` and ``times``; or ``error`` instead of the latter three,
+		if the benchmark failed.
+	"""
+	selected = [(n, f) for n, f in benchmarks if not names or n in names]
+	workdir = tempfile.mkdtemp(prefix='kathaireo-bench')
+	settings = (rdf.cache.directory, rdf.remote.ttl)
+	rdf.cache.directory = os.path.join(workdir, 'cache')
+	rdf.cache._index = None
+	# don't let namespace downloads interfere
+	rdf.remote.ttl = float('inf')
+	rdf.remote.report(False)
+	results = []
+	try:
+		for scale in scales:
+			with contextlib.redirect_stdout(io.StringIO()):
+				ctx = Context(scale, workdir, namespaces=namespaces,
+					literals=literals)
+			for name, func in selected:
+				res = {'name': name, 'scale': scale, 'triples': len(ctx.graph)}
+				try:
+					with contextlib.redirect_stdout(io.StringIO()):
+						times = measure(func, ctx, repeats)
+					res.update({'min': min(times),
+						'median': sorted(times)[len(times)//2], 'times': times})
+				except Exception as e:
+					# keep going, but don't compare
+					res['error'] = '{}: {}'.format(type(e).__name__, e)
+				results.append(res)
+				if report:
+					report(res)
+			ctx.close()
+	finally:
+		rdf.cache.directory, rdf.remote.ttl = settings
+		rdf.remote._status.update(online=None, since=0)
+		rdf.cache._index = None
+		shutil.rmtree(workdir, ignore_errors=True)
+	meta = {'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+		'python': platform.python_version(), 'platform': platform.platform(),
+		'rdflib': rdf.rdflib.__version__, 'scales': list(scales),
+		'repeats': repeats, 'namespaces': namespaces, 'literals': literals}
+	return {'meta': meta, 'results': results}
+
+
+# print result
+def show(res):
+	"""Prints a result as one line of a table."""
+	if 'error' in res:
+		print('{:<14} {:>9} failed: {}'.format(res.get('name'),
+			res.get('scale'), res.get('error')[:200]))
+	else:
+		print('{:<14} {:>9} {:>10.4f}s {:>10.4f}s'.format(res.get('name'),
+			res.get('scale'), res.get('min'), res.get('median')))
+	sys.stdout.flush()
+
+
+usage = """\
+usage: python -m benchmarks.run [-s scales] [-r repeats] [-n namespaces]
+	[-l literal ratio] [-o results.json] [benchmark ...]
+
+benchmarks: {}"""
+
+
+def main(argv):
+	try:
+		opts, names = getopt.getopt(argv, 's:r:n:l:o:h')
+		opts = dict(opts)
+		params = {'scales': [int(s) for s in opts.get('-s',
+			','.join(map(str, scales))).split(',')],
+			'repeats': int(opts.get('-r', repeats)),
+			'namespaces': int(opts.get('-n', 4)),
+			'literals': float(opts.get('-l', 0.3))}
+	except (getopt.GetoptError, ValueError):
+		opts, names = ({'-h': ''}, [])
+	unknown = [n for n in names if not n in dict(benchmarks)]
+	if '-h' in opts or unknown:
+		sys.stderr.write(usage.format(', '.join(
+			['"{}"'.format(n) for n, f in benchmarks]))+'\n')
+		return 2
+	print('{:<14} {:>9} {:>11} {:>11}'.format('benchmark', 'scale', 'min',
+		'median'))
+	data = run(names=names, report=show, **params)
+	if '-o' in opts:
+		with open(opts.get('-o'), 'w') as f:
+			json.dump(data, f, indent=1)
+		print('Wrote results to {}.'.format(opts.get('-o')))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
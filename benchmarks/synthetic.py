@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Deterministic generator of synthetic RDF graphs.
+
+A graph consists of a vocabulary of classes and properties, declared
+by ``rdf:type`` statements, and of resources which are typed by those
+classes and related to each other or to literals by those properties.
+Resources and vocabulary are spread over a number of namespaces, which
+are bound to prefixes ``ns0``, ``ns1``, and so on.
+
+Output only depends on the parameters, including the `seed` of the
+random number generator, so that benchmarks run on identical input.
+Documents are written in Turtle:
+::
+
+	python -m benchmarks.synthetic 100000 -n 8 -l 0.3 -o /tmp/100k.ttl
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import sys
+import random
+import getopt
+
+base = 'http://bench.kathaireo.example.org/'
+"""URL under which namespaces are made up."""
+
+# words to build literals from
+_words = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta',
+	'theta', 'iota', 'kappa', 'lambda', 'mu', 'nu', 'xi', 'omicron', 'pi',
+	'rho', 'sigma', 'tau', 'upsilon', 'phi', 'chi', 'psi', 'omega']
+
+
+# namespace url by index
+def namespace(i):
+	"""Returns the URL of the `i`-th namespace."""
+	return '{}ns{}/v#'.format(base, i)
+
+
+# generate statements
+def triples(count, namespaces=4, literals=0.3, seed=0):
+	"""Yields `count` statements in Turtle notation, one per line,
+	without prefix declarations (see :func:`document`).
+
+	:param count: number of statements
+	:param namespaces: number of namespaces used
+	:param literals: share of statements whose object is a literal
+	:param seed: seed of the random number generator
+	"""
+	rnd = random.Random(seed)
+	# vocabulary size grows slowly with graph size
+	vocab = max(4, int(count ** 0.5) // 4)
+	resources = max(1, count // 8)
+	classes = [('ns{}'.format(i % namespaces), 'Class{}'.format(i))
+		for i in range(vocab)]
+	props = [('ns{}'.format(i % namespaces), 'prop{}'.format(i))
+		for i in range(vocab)]
+	n = 0
+	# declarations
+	for nsp, name in classes:
+		if n >= count:
+			return
+		yield '{}:{} a rdfs:Class .'.format(nsp, name)
+		n += 1
+	for nsp, name in props:
+		if n >= count:
+			return
+		yield '{}:{} a rdf:Property .'.format(nsp, name)
+		n += 1
+	# statements about resources
+	while n < count:
+		subj = rnd.randrange(resources)
+		s = 'ns{}:res{}'.format(subj % namespaces, subj)
+		if rnd.random() < 1./8:
+			o = '{}:{}'.format(*classes[rnd.randrange(vocab)])
+			yield '{} a {} .'.format(s, o)
+		else:
+			p = '{}:{}'.format(*props[rnd.randrange(vocab)])
+			if rnd.random() < literals:
+				o = '"{} {}"'.format(rnd.choice(_words), rnd.randrange(count))
+			else:
+				obj = rnd.randrange(resources)
+				o = 'ns{}:res{}'.format(obj % namespaces, obj)
+			yield '{} {} {} .'.format(s, p, o)
+		n += 1
+
+
+# generate document
+def document(count, namespaces=4, literals=0.3, seed=0):
+	"""Yields the lines of a Turtle document containing the
+	statements produced by :func:`triples` for the same parameters."""
+	yield '@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .'
+	yield '@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .'
+	for i in range(namespaces):
+		yield '@prefix ns{}: <{}> .'.format(i, namespace(i))
+	for line in triples(count, namespaces=namespaces, literals=literals,
+		seed=seed):
+		yield line
+
+
+# write document to file
+def write(filename, count, namespaces=4, literals=0.3, seed=0):
+	"""Writes a document generated by :func:`document` to `filename`."""
+	with open(filename, 'w') as f:
+		for line in document(count, namespaces=namespaces,
+			literals=literals, seed=seed):
+			f.write(line+'\n')
+	return filename
+
+
+def main(argv):
+	try:
+		opts, args = getopt.getopt(argv, 'n:l:s:o:')
+		opts = dict(opts)
+		count = int(args[0])
+		params = {'namespaces': int(opts.get('-n', 4)),
+			'literals': float(opts.get('-l', 0.3)), 'seed': int(opts.get('-s', 0))}
+	except (getopt.GetoptError, IndexError, ValueError):
+		sys.stderr.write('usage: synthetic.py <triples> [-n namespaces] '
+			'[-l literal ratio] [-s seed] [-o file]\n')
+		return 2
+	if '-o' in opts:
+		write(opts.get('-o'), count, **params)
+	else:
+		for line in document(count, **params):
+			sys.stdout.write(line+'\n')
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
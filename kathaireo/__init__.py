@@ -100,9 +100,11 @@ TODO
 
 __docformat__ = "restructuredtext en"
 __version__ = "0.0.12-dev"
-__all__ = ['rdf', 'commands', 'shell', 'cmd_handler']
+__all__ = ['rdf', 'commands', 'shell', 'batch', 'cmd_handler']
 
-from kathaireo import rdf, commands, shell
+from kathaireo import rdf, commands
+# the shell package (readline, highlighting) gets imported only
+# when needed, so that batch mode (see :mod:`.batch`) can do without it
 
 # decorator for command handler functions
 cmd_handler=commands.register_handler
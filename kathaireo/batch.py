@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Non-interactive execution of command sequences.
+
+Lines of a script file (``kathaireo-shell -f script.kth``) or commands
+given on the command line (``kathaireo-shell -c "cmd; cmd"``) are
+passed straight to :func:`.commands.execute`, one after another. Neither
+`readline` nor the :mod:`.shell` package with its highlighting is
+loaded. Results are printed as plain text or as one JSON object per
+command. Execution stops at the first command that fails, and a summary
+of the time each command took is written to stderr.
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import io
+import re
+import sys
+import time
+import json
+import contextlib
+
+from kathaireo import rdf, commands
+
+# markup of error messages returned by handlers
+errex = re.compile('\A\s*!{1,2}(?!Warning)[^!]+!{1,2}')
+# markup of emphasized text and warnings
+_markex = [re.compile('!{1,2}([^!]+)!{1,2}'), re.compile('\*([^*\s][^*]*)\*')]
+
+
+# read commands from script file
+def read_script(filename):
+	"""Returns the commands in a script file, one per line. Empty lines
+	and lines beginning with ``#`` are left out."""
+	with open(filename) as f:
+		return [l.strip() for l in f if l.strip() and not l.strip().startswith('#')]
+
+
+# split command line argument into commands
+def split_commands(line):
+	"""Returns the commands in a string separated by ``;``."""
+	return [c.strip() for c in line.split(';') if c.strip()]
+
+
+# render command result line by line
+def lines(result):
+	"""Returns the lines of a command result, which may be a string,
+	a list or an iterator of lines, or any other object."""
+	if result is None:
+		return []
+	if type(result) is str:
+		return result.split('\n')
+	if type(result) is list or iter(result) is result:
+		return [u'{}'.format(l) for l in result]
+	return [u'{}'.format(result)]
+
+
+# remove highlighting markup
+def plain(line):
+	"""Strips the ``!warning!`` and ``*emphasis*`` markup from a line."""
+	for rex in _markex:
+		line = rex.sub(r'\1', line)
+	return line
+
+
+# tell failed commands
+def failed(output):
+	"""Tells whether the lines of a command's output start with an
+	error message."""
+	return len(output) > 0 and errex.match(output[0]) is not None
+
+
+# execute single command
+def execute(line):
+	"""Executes a command and collects its output, including anything
+	printed to stdout meanwhile.
+
+	:returns: dictionary with keys ``command``, ``ok``, ``output``
+		(list of lines), ``log`` (list of lines printed) and ``seconds``
+	"""
+	start = time.time()
+	printed = io.StringIO()
+	ok = True
+	try:
+		with contextlib.redirect_stdout(printed):
+			output = lines(commands.execute(line))
+	except Exception as e:
+		output = ['!!Error!!: {}: {}'.format(type(e).__name__, e)]
+		ok = False
+	ok = ok and not failed(output)
+	log = [l.split('\r')[-1] for l in printed.getvalue().split('\n') if l.strip()]
+	return {'command': line, 'ok': ok, 'output': output, 'log': log,
+		'seconds': time.time()-start}
+
+
+# run command sequence
+def run(cmds, jsonlines=False, out=None, err=None):
+	"""Executes commands one after another until one of them fails.
+	Results are written to `out` (default: stdout), either as plain
+	text or, if `jsonlines` is set, as one JSON object per command (see
+	:func:`execute`). A timing summary is written to `err` (default:
+	stderr).
+
+	:returns: exit code; ``0`` if all commands succeeded,
+		``1`` otherwise.
+	"""
+	out = out or sys.stdout
+	err = err or sys.stderr
+	rdf.set_graph(None)
+	results = []
+	for line in cmds:
+		try:
+			res = execute(line)
+		except SystemExit:
+			# `exit` command
+			break
+		results.append(res)
+		if jsonlines:
+			out.write(json.dumps(res)+'\n')
+		else:
+			for l in res.get('log')+res.get('output'):
+				out.write(plain(l)+'\n')
+		out.flush()
+		if not res.get('ok'):
+			break
+	summary(results, cmds, err)
+	if len(results) > 0 and not results[-1].get('ok'):
+		return 1
+	return 0
+
+
+# print timing summary
+def summary(results, cmds, err):
+	"""Writes the time taken by each command to `err`."""
+	width = max([len(r.get('command')) for r in results] + [7])
+	for r in results:
+		err.write(u'{:<{}}  {:>8.3f}s  {}\n'.format(r.get('command'), width,
+			r.get('seconds'), ['FAILED', 'ok'][int(r.get('ok'))]))
+	err.write(u'{:<{}}  {:>8.3f}s  {} of {} commands run\n'.format('total', width,
+		sum([r.get('seconds') for r in results]), len(results), len(cmds)))
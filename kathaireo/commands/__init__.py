@@ -54,6 +54,7 @@ import os
 
 from . import arguments
 from . import handlers
+from . import profiler
 from .. import rdf
 from .. import util
 
@@ -66,6 +67,9 @@ cmdict={}
 """Assembles a tree (more precisely: a forest) of which each path that
 leads from a root all the way down to a leaf, stands for a legal command."""
 
+version=0
+"""Incremented whenever a command syntax gets registered."""
+
 
 # define regular expressions for command resolution
 # argument placeholder
@@ -73,11 +77,113 @@ argex=re.compile('<([a-zA-Z_]\w*)>')
 # single term
 trmex=re.compile('(\".+\"|\S+)')
 # file name TODO: besser
-flnex=re.compile('\S+\.(rdf|owl|RDF|OWL|xml|n3)')
+flnex=re.compile('\S+\.(rdf|owl|RDF|OWL|xml|n3|ttl|nt|nq|trig|jsonld)')
+# glob pattern
+globex=re.compile('\S*[*?[]\S*')
+# directory
+dirnex=re.compile('\S+/\Z')
 # url
 urlex = util.urlex
 
 
+# existing directory, named with or without trailing slash
+class _Directory(object):
+	"""Stands in for a regular expression in argument formats,
+	matching names of existing directories."""
+	def search(self, str):
+		return os.path.isdir(str)
+
+direx=_Directory()
+
+
+# compiled form of cmdict, rebuilt when version changes
+_matcher={'version': None, 'root': None}
+
+prefixes={'time': profiler.timed, 'profile': profiler.profiled}
+"""Terms which, put in front of a command, have its handler called by
+the function they map to. Those are passed the handler and its
+arguments and return what is to be displayed instead of the handler's
+output (see :mod:`.profiler`). A prefix is only recognized if no
+command begins with it."""
+
+
+# node of compiled command syntax forest
+class _Node(object):
+	"""Level of :data:`cmdict`, its keys sorted into keywords and
+	argument placeholders in advance."""
+	def __init__(self, level, nodes):
+		nodes[id(level)] = self
+		self.keys = list(level.keys())
+		self.handler = level.get('')
+		self.keywords = {}
+		self.args = []
+		for term, down in level.items():
+			if term == '':
+				continue
+			child = nodes.get(id(down)) or _Node(down, nodes)
+			if argex.search(term):
+				self.args.append((argex.findall(term)[0], term, child))
+			else:
+				self.keywords[term] = child
+
+	def step(self, term):
+		"""Yields ``(argument, child)`` for each way `term` can be
+		read at this level: as a keyword (argument `None`) first, then
+		as a value of any of the placeholders accepting it."""
+		child = self.keywords.get(term)
+		if child:
+			yield (None, child)
+		for arg, _, child in self.args:
+			if arguments.validate(arg, term):
+				yield (arg, child)
+
+
+# get compiled command syntax forest
+def matcher():
+	"""Returns the root of the compiled form of :data:`cmdict`, which
+	is rebuilt whenever a command has been registered since."""
+	if _matcher.get('version') != version:
+		_matcher['root'] = _Node(cmdict, {})
+		_matcher['version'] = version
+	return _matcher.get('root')
+
+
+# follow all readings of terms through syntax forest
+def _walk(terms):
+	"""Reads the given terms along all paths of the compiled syntax
+	forest they fit. Any number of readings is followed at once, but
+	only the first one to reach a node is kept, preferring keywords
+	over placeholders, and placeholders in order of registration.
+	Thus, a term read as the wrong placeholder can't prevent the right
+	command from being found, and work per term is bounded by the number
+	of syntax nodes.
+
+	:returns: tuple ``(states, count)``, where `states` is a list of
+		tuples ``(node, args, kwargs)`` reached after reading `count`
+		terms. `count` is less than the number of terms if some term
+		couldn't be read, in which case `states` are the last ones
+		reached before.
+	"""
+	states = [(matcher(), [], {})]
+	for i, term in enumerate(terms):
+		seen = set()
+		down = []
+		for node, args, kwargs in states:
+			for arg, child in node.step(term):
+				if not id(child) in seen:
+					seen.add(id(child))
+					if arg is None:
+						down.append((child, args, kwargs))
+					else:
+						kw = kwargs.copy()
+						kw[arg] = term
+						down.append((child, args+[term], kw))
+		if len(down) < 1:
+			return (states, i)
+		states = down
+	return (states, len(terms))
+
+
 # implementation of decorator @cmd_handler
 def register_handler(func):
 	"""\
@@ -186,9 +292,11 @@ def register(syntax, function):
 	# at last, attach leave referring to function(args**,
 	# **kwargs) responsible for handling the new command
 	# unless, of course, command already exists
+	global version
 	boundf = level.get('')
 	if not boundf:
 		level[''] = function
+		version += 1
 		msg=' '.join([
 			'Registered handling function {}{}',
 			'for command syntax \"{}\".'])
@@ -226,6 +334,18 @@ def msg_incomplete_cmd(keywords):
 	return msg
 
 
+# find command prefix at beginning of input
+def _prefix(input):
+	"""Returns the function mapped to in :data:`prefixes` by the first
+	term of `input`, and the position in `input` where the command
+	following it begins; or ``(None, 0)`` if there is no prefix."""
+	match = re.match('\s*(\S+)\s+', input)
+	if match and match.group(1) in prefixes:
+		if not match.group(1) in matcher().keywords:
+			return (prefixes.get(match.group(1)), match.end())
+	return (None, 0)
+
+
 # execute input string, if command matches
 def execute(input):
 	"""\
@@ -235,84 +355,40 @@ def execute(input):
 	function is called. If matching syntax contains
 	argument placeholders (`"command <arg>"`), their
 	respective values are extracted from the input and
-	passed to the handler function.
+	passed to the handler function. If the command is
+	preceded by one of the :data:`prefixes`, the handler
+	is called by the function it maps to.
 	"""
+	wrapper, pos = _prefix(input)
 	# split input string into single terms
-	terms = trmex.findall(input)
-	# init path log for recreation of generic command
-	path = []
-	args = []
-	kwargs = {}
-	# return message
-	msg = ''
-	# check if terms match known commands:
-	# begin at language tree root
-	level = cmdict
-	# walk down as long as input seems to be
-	# a valid command language word, i.e. input
-	# term reachable by walking along its predecessors
-	term = ''
-	for term in terms:
-		#print ' '.join(level.keys())
-		# still on track?
-		if term in level:
-			level = level.get(term)
-			path.append(term)
-		else:
-			# might be just an argument value that we
-			# need to recognize, validate and extract
-			# first, get all argument ids that
-			# might be applicable
-			argnames = [t for t in level.keys()
-				if argex.search(t)]
-			resolved = False
-			if len(argnames)>0:
-				# then test if found input is valid for
-				# at least one of them
-				#TODO: we will probably have to recurse
-				#TODO here, because we might get on the
-				# wrong track by picking just any matching
-				# placeholder here
-				for a in argnames:
-					if not resolved:
-						arg = argex.findall(a)[0]
-						if arguments.validate(arg, term):
-							#print 'reading value for argument',
-							#print '{}: {}.'.format(a,term)
-							# input valid! collect value
-							args.append(term)
-							kwargs[arg] = term
-							# proceed
-							level = level.get(a)
-							path.append(a)
-							resolved=True
-			if not resolved:
-				# path lost -> input not in language
-				# not a valid command
-				msg = term
-				term = None
-				break
+	terms = trmex.findall(input[pos:])
+	# find all readings of input in language tree
+	states, count = _walk(terms)
 	# do we have a match? or not?
-	if term is None:
-		return '!!Syntax error!!: term "{}" not recognized.'.format(msg)
-	else:
-		# if EOL code terminates term sequence, we are good.
+	if count < len(terms):
+		return '!!Syntax error!!: term "{}" not recognized.'.format(terms[count])
+	# if EOL code terminates term sequence, we are good.
+	matches = [st for st in states if st[0].handler]
+	if len(matches) < 1:
 		# if not, input is incomplete
-		if level.get('') is None:
-			msg = msg_incomplete_cmd(level.keys())
-			# return a hint on expected input
-			return msg
-		else:
-			# we have a match!
-			# command is valid! get handler!
-			# print ' '.join(path)
-			func = level.get('')
-			#print 'Calling {}'.format(func.__name__)
-			ret = func(*args, **kwargs)
-			# log argument values
-			for arg,v in kwargs.items():
-				arguments.to_history(arg,v)
-			return ret
+		keys = []
+		for node, _, _ in states:
+			keys.extend([k for k in node.keys if not k in keys])
+		# return a hint on expected input
+		return msg_incomplete_cmd(keys)
+	# we have a match!
+	# command is valid! get handler!
+	node, args, kwargs = matches[0]
+	if wrapper:
+		ret = wrapper(node.handler, args, kwargs)
+	else:
+		ret = node.handler(*args, **kwargs)
+	# log argument values
+	for arg,v in kwargs.items():
+		arguments.to_history(arg,v)
+	if kwargs:
+		arguments.save_history()
+	return ret
 
 
 
@@ -337,9 +413,9 @@ def choices_left(input, csrange):
 	# range of relevant input (beginning of incomplete word
 	#	and cursor position)
 	beg, end = csrange
-	# begin traversing language tree as long as it matches current input
-	level = cmdict
-	level_down = level
+	# complete command following a prefix
+	_, pos = _prefix(input[:end])
+	input, beg, end = (input[pos:], beg-pos, end-pos)
 	# split input string into single terms
 	# BUT only up to cursor position!
 	terms = trmex.findall(input[:end])
@@ -348,67 +424,28 @@ def choices_left(input, csrange):
 	if re.match('.*\s+\Z', input[:end]) or end-beg<1:
 		terms.append('')
 	util.log('autocomplete: detected tokens are {}'.format(terms))
-	#print '\nfind choices for:',terms
-	# #########################3
-	# parse incomplete input
-	# word by word
-	for term in terms:
-		# walk downwards
-		level = level_down
-		if term in level:
-			#print 'fitting:', term
-			level_down = level.get(term)
-		else:
-			# if not a keyword, term might be an attribute value
-			argnames = [t for t in level.keys()
-				if argex.search(t)]
-			resolved = False
-			if len(argnames)>0:
-				# check if term satisfies any attribute value requirements
-				# TODO: auch hier das problem, dasz sich mit dem erstbesten
-				# TODO zufrieden gegeben wird..?
-				for a in argnames:
-					if not resolved:
-						arg = argex.findall(a)[0]
-						# print '(argument to match is {})'.format(a)
-						if arguments.validate(arg, term):
-							# value matches attribute. proceed
-							level_down = level.get(a)
-							resolved=True
-			if not resolved:
-				# here is probably where the input breaks up.
-				# also possibly where input goes on invalidly
-				# nevertheless, we have to proceed until there
-				# is no input left at all. otherwise, we might
-				# end up with autocomplete suggestions for terms
-				# in the middle of nowhere. If an input turns out
-				# to be invalid way before it is done parsing,
-				# then we simply can't provide autocompletion
-				# for that input.
-				# TODO: or can we? how exactly is cursor position
-				# handled by readline module???
-				break
-	# incomplete input line has been matched against known
-	# commands as far as possible. what do we have here?
-	# possibility 1): input ends w potential or partly typed keyword
-	# possibility 2): input ends where a value should follow
-	# or is partly typed in
-	#print 'fragment, keys:', term, level.keys()
-	choices1 = [k for k in level.keys()]
-	util.log('autocomplete: possible input is {}.'.format(choices1))
-	#print term, ':', choices1
+	# read all complete terms along every path they fit. If an input
+	# turns out to be invalid before the term to be completed, then we
+	# simply can't provide autocompletion for that input.
+	term = terms[-1]
+	states, count = _walk(terms[:-1])
+	if count < len(terms)-1:
+		return []
+	# input ends w potential or partly typed keyword, or where
+	# a value should follow or is partly typed in
 	choices = []
-	for c in choices1:
-		# resolve argument, if any
-		if argex.search(c):
-			a = argex.findall(c)[0]
-			util.log('Apply for completion candidates for arg {}.'.format(a))
-			choices.extend(arguments.get_suggestions(a, term))
-		else:
-			# if not expecting argument: check if keyword can be
-			# completed
+	for node, _, _ in states:
+		for c in node.keywords:
+			# check if keyword can be completed
 			if c.startswith(term):
 				choices.append(c)
+		for a, _, _ in node.args:
+			util.log('Apply for completion candidates for arg {}.'.format(a))
+			choices.extend(arguments.get_suggestions(a, term))
+	# a command may be preceded by a prefix
+	if pos == 0 and len(terms) == 1:
+		choices.extend([p for p in prefixes if p.startswith(term)])
+	choices = list(dict.fromkeys(choices))
 	# by default, append whitespace behind completion choice
 	# if completion is ultimate (e.g. command names).
 	# If choice ends on ;, this means it can possibly be
@@ -444,10 +481,12 @@ default_cmds = {
 	#':q': handlers.quit,
 	#'create <graph>': handlers.create_graph,
 	'create <graph> store sqlite <sqlite>': handlers.store_sqlite,
+	'create <graph> store sqlite <sqlite> profile <profile>': handlers.store_sqlite,
 	'load <resource> <graph>': handlers.parse_rdf,
 	'show <graph> <attribute>': handlers.graph_info,
 	#'load namespaces <graph>': handlers.import_namespaces,
 	'connect <graph> to sqlite <sqlite>': handlers.store_sqlite,
+	'connect <graph> to sqlite <sqlite> profile <profile>': handlers.store_sqlite,
 	#'save <graph> to xml <filename>': handlers.store_xml,
 	#'save xml <filename>': handlers.store_xml,
 	'copy <graph> <graph>': handlers.cp_graph,
@@ -486,7 +525,7 @@ def init():
 	# read, compile, register stdcmd.py
 	# ok. read commands from stdcmd.py
 	from . import stdcmd
-	print('parse', stdcmd.__file__)
+	util.log('parse {}'.format(stdcmd.__file__))
 	for fn, cc in stdcmd.__dict__.items():
 		if hasattr(handlers, fn):
 			f = handlers.__dict__.get(fn)
@@ -496,7 +535,7 @@ def init():
 					register(c, f)
 	# TODO: arguments!
 	del stdcmd
-	print('done.')
+	util.log('done.')
 
 
 
@@ -515,7 +554,17 @@ init() #TODO: sure this shouldnt be called by application modules
 # TODO: write decorator to handle arguments like commands
 # <resources>
 reg_arg("resource", proposer=arguments.list_files_rdf,
-	format=[flnex, urlex])
+	format=[flnex, urlex, globex, dirnex, direx])
+
+# <batchsize>
+reg_arg("batchsize", format=[re.compile('\A\d+\Z')])
+
+# <workers>
+reg_arg("workers", format=[re.compile('\A\d+\Z')])
+
+# <limit>, <offset>
+reg_arg("limit", format=[re.compile('\A\d+\Z')])
+reg_arg("offset", format=[re.compile('\A\d+\Z')])
 
 # <attribute>
 attrs='|'.join(rdf.rdfinfotempl.keys())
@@ -527,6 +576,10 @@ del attrs
 reg_arg("sqlite", proposer=arguments.list_files_sqlite,
 	format=[re.compile('.*\.sqlite3?')])
 
+# <profile> (sqlite tuning)
+reg_arg("profile", proposer=arguments.sqlite_profiles,
+	format=[re.compile('\A({})\Z'.format('|'.join(rdf.storage.profiles)))])
+
 # <filename>
 reg_arg("filename", proposer=arguments.list_files_rdf,
 	format=[flnex])
@@ -22,7 +22,7 @@ __version__ = "0.0.18a-dev"
 
 import re
 import os
-from glob import glob
+import json
 
 from .. import rdf
 from .. import util
@@ -52,11 +52,116 @@ arghs = {}
 """Directory of registered argument identifiers, each one referencing their
 assigned :class:`.Argument` instance."""
 
+histsize = 200
+"""Maximum number of distinct values kept in each argument's history."""
+
+histfile = os.path.join(util.datadir, 'history')
+"""File in which argument histories are kept across sessions."""
+
+# histories loaded from file: {argument name: [[value, count, last], ...]}
+_saved = None
+
+# number of values submitted so far, for telling their recency
+_clock = [0]
+
+# validation results: {(argument name, value): bool}
+_validated = {}
+
 # default regex for e.g identifiers, names
 namex = re.compile('\A[a-zA-Z_]\w*\Z')
 # for urls
 urlex = util.urlex
 
+###############################################################
+#################   arg value history class  ##################
+###############################################################
+class History(object):
+	"""Bounded record of the distinct values submitted for an argument.
+	Each value is kept once, along with the number of times it has been
+	used and when it was used last. If there are more than :data:`histsize`
+	values, the least recently used one is dropped. Values are also filed
+	in a character trie, so that finding those beginning with a prefix
+	takes time proportional to the prefix length plus the number of
+	values found."""
+	def __init__(self, entries=[]):
+		# {value: [count, last used]}
+		self.entries = {}
+		self._trie = {}
+		for value, count, last in entries:
+			self.add(value, count=count, last=last)
+
+	def add(self, value, count=1, last=None):
+		"""Records a use of `value`."""
+		if last is None:
+			_clock[0] += 1
+			last = _clock[0]
+		_clock[0] = max(_clock[0], last)
+		entry = self.entries.get(value)
+		if entry is None:
+			self.entries[value] = [count, last]
+			node = self._trie
+			for c in value:
+				node = node.setdefault(c, {})
+			node[''] = value
+			if len(self.entries) > histsize:
+				self.remove(min(self.entries.items(), key=lambda e:e[1][1])[0])
+		else:
+			entry[0] += count
+			entry[1] = max(entry[1], last)
+
+	def remove(self, value):
+		"""Drops `value` from the history."""
+		if self.entries.pop(value, None) is None:
+			return
+		# walk down, then prune branches left empty
+		path = [self._trie]
+		for c in value:
+			path.append(path[-1][c])
+		del path[-1]['']
+		for c, node in zip(value[::-1], path[-2::-1]):
+			if len(node[c]) > 0:
+				break
+			del node[c]
+
+	def starting(self, prefix):
+		"""Returns the values beginning with `prefix`, unordered."""
+		node = self._trie
+		for c in prefix:
+			node = node.get(c)
+			if node is None:
+				return []
+		res = []
+		stack = [node]
+		while stack:
+			node = stack.pop()
+			for c, child in node.items():
+				if c == '':
+					res.append(child)
+				else:
+					stack.append(child)
+		return res
+
+	def score(self, value):
+		"""Rates a value by how often and how recently it was used.
+		Uses count less the further they date back."""
+		count, last = self.entries.get(value, [0, 0])
+		return count * .5**((_clock[0]-last)/20.)
+
+	def propose(self, prefix):
+		"""Returns the values beginning with `prefix`, best rated first."""
+		return sorted(self.starting(prefix), key=self.score, reverse=True)
+
+	def dump(self):
+		"""Returns the history as a list of ``[value, count, last]`` entries."""
+		return [[v, c, l] for v, (c, l) in self.entries.items()]
+
+	def __iter__(self):
+		return iter(sorted(self.entries, key=lambda v:self.entries[v][1]))
+
+	def __len__(self):
+		return len(self.entries)
+
+
 ###############################################################
 #################   arg configuration class  ##################
 ###############################################################
@@ -80,7 +185,7 @@ class Argument(object):
 		self.propose_func = propose_default
 		self.validator_func = regex_validator([namex])
 		self.resolve_func = resolve_default
-		self.hist = []
+		self.hist = History(_load_history().get(name, []))
 		# save configuration for arg id
 		arghs[name] = self
 		#TODO: every arg configuration should have an optional reification function for argument value resolution (retrieve actual graph for a <graph> value)
@@ -152,7 +257,7 @@ def proposer(func):
 			#TODO: also detect regexes for arg validation, or change arg validation to function, too
 			args.extend(re.findall('^\s*`<([^> `]+)`', line))
 		for arg in args:
-			arghs.get(arg, Argument(arg)).propose_func = func
+			get_arg(arg).propose_func = func
 	#TODO: maybe wrap in inner function, making sure that correct number of parameters is given at call..?
 	return func
 
@@ -164,18 +269,24 @@ def proposer(func):
 ####################    module functions   ####################
 ###############################################################
 
+# retrieve argument configuration
+def get_arg(name):
+	"""Returns the :class:`.Argument` instance registered for the given
+	argument identifier. If there is none, a default one is created."""
+	argh = arghs.get(name)
+	if argh is None:
+		argh = Argument(name)
+	return argh
+
+
 # default function for value proposal
 def propose_default(arg, prefix):
 	"""Default function for argument value proposal.
-	Iterate over previous values for this argument (LIFO) and
-	suggests those that match the given prefix.
+	Suggests previous values for this argument that match the given
+	prefix, those used most often and most recently first (see
+	:meth:`.History.propose`).
 	"""
-	#hist = arghist.get(arg, [])
-	#hist = arghs.get(arg, Argument(arg)).hist
-	hist = arg.hist
-	# return items of history list in reverse order
-	suggestions = [v for v in hist[::-1] if v.startswith(prefix)]
-	return suggestions
+	return arg.hist.propose(prefix)
 
 
 # default function for value resolution
@@ -207,10 +318,10 @@ def get_suggestions(name, prefix):
 	function and returns resulting suggestions, stripped of double occurences.
 	"""
 	# get validator or assign a new default instance
-	argh = arghs.get(name, Argument(name))
+	argh = get_arg(name)
 	# call it
 	suggestions = argh.propose(prefix)
-	return [v for i,v in enumerate(suggestions) if suggestions[:i+1].count(v) < 2]
+	return list(dict.fromkeys(suggestions))
 
 
 
@@ -218,21 +329,54 @@ def get_suggestions(name, prefix):
 def validate(arg, input):
 	"""Validates given input string according to specified
 	argument's value restrictions.
-	Return true if input is ok."""
-	validator = arghs.get(arg, Argument(arg))
-	return validator.validate(input)
+	Return true if input is ok. Results are remembered until
+	an argument gets registered."""
+	key = (arg, input)
+	valid = _validated.get(key)
+	if valid is None:
+		if len(_validated) > 10000:
+			_validated.clear()
+		valid = bool(get_arg(arg).validate(input))
+		_validated[key] = valid
+	return valid
 
 
 # add to arg history
 def to_history(arg, value):
 	"""Append a value to an argument's input history stored in the ``hist`` member of
 	the :class"`.Argument` instance assigned to the argument's identifier in the
-	:obj:`arghs` dictionary."""
-	#hist = arghist.get(arg, [])
-	#if not arg in arghist:
-		#arghist[arg] = hist
-	hist = arghs.get(arg, Argument(arg)).hist
-	hist.append(value)
+	:obj:`arghs` dictionary. Histories are written to :data:`histfile`
+	by :func:`save_history`."""
+	get_arg(arg).hist.add(value)
+
+
+# read argument histories from file
+def _load_history():
+	global _saved
+	if _saved is None:
+		_saved = {}
+		try:
+			with open(histfile) as f:
+				_saved = json.load(f)
+		except (IOError, OSError, ValueError):
+			pass
+	return _saved
+
+
+# write argument histories to file
+def save_history():
+	"""Writes the value histories of all arguments to :data:`histfile`."""
+	hists = _load_history()
+	hists.update({n:a.hist.dump() for n, a in arghs.items() if len(a.hist) > 0})
+	try:
+		if not os.path.isdir(os.path.dirname(histfile)):
+			os.makedirs(os.path.dirname(histfile))
+		tmp = histfile+'.tmp'
+		with open(tmp, 'w') as f:
+			json.dump(hists, f, separators=(',', ':'))
+		os.replace(tmp, histfile)
+	except (IOError, OSError) as e:
+		util.log('Could not save argument history: {}'.format(e))
 
 
 
@@ -281,6 +425,8 @@ def register(name, proposer=propose_default, format=None):
 		validator.propose_func = proposer
 	if type(format) is list:
 		validator.format = format
+		validator.validator_func = regex_validator(format)
+		_validated.clear()
 
 
 ########################################################
@@ -291,12 +437,66 @@ def register(name, proposer=propose_default, format=None):
 ########################################################
 ########################################################
 
+maxentries = 10000
+"""Maximum number of entries read from a single directory
+when listing files for completion."""
+
+# directory listings: {path: (mtime, subdirectories, {extension: files})}
+_dircache = {}
+
+# number of directory listings kept
+_dircachesize = 64
+
+
+# list directory contents, classified by extension
+def scandir(path):
+	"""Returns the names of the subdirectories of directory `path` and
+	its files, the latter filed under their extensions. Listings are
+	read by a single ``os.scandir`` pass and cached until the
+	directory's modification time changes. At most :data:`maxentries`
+	entries are read.
+
+	:returns: tuple ``(subdirectories, {extension: filenames})``, or
+		`None` if `path` can't be read
+	"""
+	try:
+		mtime = os.stat(path).st_mtime
+	except OSError:
+		return None
+	cached = _dircache.get(path)
+	if cached and cached[0] == mtime:
+		return cached[1:]
+	dirs = []
+	files = {}
+	try:
+		with os.scandir(path) as entries:
+			for i, entry in enumerate(entries):
+				if i >= maxentries:
+					util.log('Stop listing {} after {} entries.'.format(path, i))
+					break
+				try:
+					if entry.is_dir():
+						dirs.append(entry.name)
+						continue
+				except OSError:
+					continue
+				ext = os.path.splitext(entry.name)[1]
+				files.setdefault(ext, []).append(entry.name)
+	except OSError:
+		return None
+	if len(_dircache) >= _dircachesize:
+		_dircache.clear()
+	_dircache[path] = (mtime, dirs, files)
+	return (dirs, files)
+
+
 def lsdir(prefix, filetypes):
 	"""List contents of whatever directory can be
 	derived from given prefix. Result contains
 	subdirectories and files whose extensions and
 	names match the prefix. filetypes are passed
 	as a list of globs (``['*.rdf', '*.owl', ...]``).
+	Directory contents are obtained from :func:`scandir`.
 	"""
 	# extract path locator (relative)
 	validpath = os.path.isdir(prefix) # check if prefix already
@@ -312,23 +512,25 @@ def lsdir(prefix, filetypes):
 		else:
 			# prefix is actually valid path to directory. keep it
 			# just make sure it has a trailing os.sep
-			path = os.sep.join([lvl for lvl in prefix.split(os.sep)
-				if len(lvl)>0]+[''])
+			path = prefix.rstrip(os.sep)+os.sep
 			rpth = path
 	else:
 		path = '.'
 		rpth = ''
+	listing = scandir(path or os.sep)
+	if listing is None:
+		return []
+	dirs, byext = listing
 	# initialize sugg list with subdirs
 	# terminate string w no space char ; to let commands
 	# module know that this would be still to be
 	# extended, and hence not decorated by a trailing
 	# space, like completions normally do
-	files = ['{}{};'.format(os.path.join(path,fn), os.sep)
-				for fn in os.listdir(path)
-					if os.path.isdir(os.path.join(path,fn))]
+	files = ['{}{};'.format(os.path.join(rpth,fn), os.sep) for fn in dirs]
 	# extend by files matching extensions
 	for ext in filetypes:
-		files.extend(glob(os.path.join(rpth,ext)))
+		files.extend([os.path.join(rpth, fn) for fn in
+			byext.get(ext.lstrip('*'), []) if not fn.startswith('.')])
 	# make sure files match prefix
 	files = [fn for fn in files if fn.startswith(prefix)]
 	util.log('Local filenames running for autocompletion of prefix "{}":'.format(prefix) )
@@ -337,11 +539,12 @@ def lsdir(prefix, filetypes):
 
 
 # list of globs matching potential ontology files
-rdfglobs = ["*.rdf", "*.RDF", "*.owl", "*.OWL", "*.n3", "*.xml"]
-# list ontology files in current directory (rdf, owl, n3, xml)
+rdfglobs = ["*.rdf", "*.RDF", "*.owl", "*.OWL", "*.n3", "*.xml",
+	"*.ttl", "*.nt", "*.nq", "*.trig", "*.jsonld"]
+# list ontology files in current directory (rdf, owl, n3, xml, ...)
 def list_files_rdf(arg, prefix):
-	"""Returns a list of local files with extensions `.rdf, .owl, .n3` and `.xml`,
-	matching given prefix.
+	"""Returns a list of local files with RDF extensions like `.rdf, .owl, .n3,
+	.ttl` and `.xml` (see :data:`rdfglobs`), matching given prefix.
 	"""
 	suggestions = lsdir(prefix, rdfglobs)
 	suggestions.extend(propose_default(arg, prefix))
@@ -369,6 +572,13 @@ def graph_attrs(arg, prefix):
 	return suggestions
 
 
+# autocomplete sqlite tuning profiles
+def sqlite_profiles(arg, prefix):
+	"""Returns the names of the tuning profiles for sqlite stores
+	(see :data:`.storage.profiles`) beginning with `prefix`."""
+	return sorted([p for p in rdf.storage.profiles if p.startswith(prefix)])
+
+
 # autocomplete namespaces
 def ls_ns(arg, prefix):
 	"""Returns currently loaded namespaces."""
@@ -393,11 +603,9 @@ def ls_rdf_ent(arg, prefix):
 		ns = rdf.namespaces.get(nn)
 		if ns:
 			#print 'found ns:', nn,
-			terms = ns.properties[:] #make deep copy or cry.
-			if arg == 'rdfentity':
-				terms.extend(ns.classes)
+			kind = ['properties', 'terms'][int(arg == 'rdfentity')]
 			suggestions.extend(['{}:{}'.format(nn,t) for
-				t in  terms if t.startswith(ent)])
+				t in ns.complete(ent, kind=kind)])
 			#print suggestions
 	else:
 		suggestions.extend([s+':;' for s in rdf.namespaces.get_names()
@@ -433,23 +641,10 @@ def ls_ns_urls(arg, prefix):
 	bnd_urls = ['{}'.format(n.url) for n in rdf.namespaces._namespaces.values()]
 	util.log('URLs suggested from namespace register: {}'.format(len(bnd_urls)))
 	suggestions.extend([u for u in bnd_urls if u.startswith(prefix)])
-	# try to extract URIs from rdf data
-	#print '\b>{}{}'.format(prefix, '\b'*len(prefix)),
-	util.log('Search completion candidates for {}.'.format(prefix))
-	# TODO: this needs to be done more carefully!!
-	for triple in rdf.ls_rdf():
-		uris = urlex.findall('{} {} {}'.format(*triple))
-		#uris = [uri[int(uri[0].startswith('file:/')):] for
-					#uri in uris]
-		#suggestions.extend([rdf.struct_uri(''.join(uri))[0]
-			#for uri in uris
-			#if any([field.startswith(prefix) for field in uri[:2]])])
-		urls = [''.join(uri[:-1])+';' for uri in uris]
-		util.log('URLs found in current graph: {}\n(total count {})'.format(', '.join(urls), len(urls)))
-		# local file paths are suggestions if they match the likewise
-		# localized input prefix
-		suggestions.extend([u for u in urls
-			if u.startswith(prefix) ])
+	# suggest namespace-like prefixes of uris in current graph
+	g = rdf.__dict__.get('current_graph')
+	if g is not None:
+		suggestions.extend([u+';' for u in rdf.search.prefixes(g).starting(prefix)])
 	# done collecting urls from graph
 	suggestions.extend(propose_default(arg, prefix))
 	suggestions = [s for s in set(suggestions)]
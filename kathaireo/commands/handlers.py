@@ -17,6 +17,7 @@ __version__ = "0.0.92-dev"
 
 
 import re
+import itertools
 
 from .. import rdf
 
@@ -115,8 +116,8 @@ def create_graph(*args, **kwargs):
 	handles:
 	`create <graph>`
 	"""
-	if "graphname" in kwargs:
-		g = rdf.create_graph(kwargs.get("graphname"))
+	if "graph" in kwargs:
+		g = rdf.create_graph(kwargs.get("graph"))
 	else:
 		return "!!Error!!: Wrong number of arguments: {}.".format(
 			len(args))
@@ -130,7 +131,7 @@ def set_graph(*args, **kwargs):
 	"""Select default graph for rdf operations.
 	handles:
 	`use <graph>`"""
-	name = kwargs.get('graphname')
+	name = kwargs.get('graph')
 	if name:
 		g = rdf.get_graph(name)
 		if g != None:
@@ -162,36 +163,25 @@ def parse_rdf(*args, **kwargs):
 	a `rdflib.Graph` identified by its name.
 
 	:param location: A String specifying the location of the
-		resource to be read. Can be a path to a local file or a URL.
+		resource to be read. Can be a path to a local file, a directory,
+		a glob pattern or a URL.
 	:param graphname: A String identifying an `rdflib.Graph` instance.
 	:returns: `True`, if parsing was successful.
 
 	handles:
 	`load <resource>`
+	`load <resource> <graph> workers <workers>`
 	"""
-	# perform standard arg resv operations, like reifying graph from graphname
-	# TODO: maybe this should even be called beforehand, by the commands parser
-	# TODO: that way, we could already have an actual parameter variable 'graph',
-	# TODO: pointing to an actual graph instance and available in this very
-	# local namespace!
-	kwargs = res_args(**kwargs)
 	location = kwargs.get('resource')
-	g = kwargs.get('graphname')
-	#name = kwargs.get('graphname')
-	if None in [location, g]:
-		if len(args)>1:
-			location, name = args[:2]
-			# FIXME: processing *args list should be left to functions
-			# that expect more than one value for the same argument name...
-			if name:
-				g = rdf.get_graph(name)
-			if not g:
-				return '!Failed! to address RDF graph!'
-		#else:
-			#name = rdf.graph_name(rdf.current_graph)
-	# FIXME: why does this lead to an additional graph instance with a
-	# rdflib.RDFUriRef identifier????
-	#if not(None in [location, name]):
+	name = kwargs.get('graph')
+	workers = kwargs.get('workers')
+	if workers:
+		workers = int(workers)
+	if name:
+		g = rdf.get_graph(name)
+	else:
+		g = rdf.__dict__.get('current_graph')
+		name = rdf.graph_name(g)
 	if location:
 		before = 0
 		# try to parse local file first,
@@ -200,14 +190,40 @@ def parse_rdf(*args, **kwargs):
 		if g:
 			before = len(g)
 		# do the stuff!
-		g = rdf.load_resource(location, name=name)
+		g = rdf.load_resource(location, name=name, workers=workers)
 		if g:
 			# return success indicator msg
 			# if no graph is selected, use this one
 			if rdf.__dict__.get('current_graph') is None:
 				rdf.set_graph(g)
-			return u'Succesfully read {} rdf statements from {} into graph "{}".'.format(
+			msg = u'Succesfully read {} rdf statements from {} into graph "{}".'.format(
 				len(g)-before, location, name)
+			# list files read from directory or glob pattern
+			if len(rdf.loaded) > 1:
+				msg = [msg]
+				for entry in rdf.loaded:
+					if 'triples' in entry:
+						how = ['format {}'.format(entry.get('format')),
+							'*cached*'][int(entry.get('cached'))]
+						msg.append(u'  {}: {} triples in {:.2f}s ({})'.format(
+							entry.get('location'), entry.get('triples'),
+							entry.get('seconds'), how))
+					else:
+						msg.append(u'  {}: !failed! after {:.2f}s'.format(
+							entry.get('location'), entry.get('seconds')))
+				return '\n'.join(msg)
+			# report detected source format
+			if 'format' in rdf.formats.last:
+				msg += u' (format *{}*, confidence {:.2f})'.format(
+					rdf.formats.last.get('format'),
+					rdf.formats.last.get('confidence'))
+			# report parse cache usage
+			if rdf.cache.last.get('hit'):
+				msg += u' (cache *hit*, saved {:.2f}s)'.format(
+					rdf.cache.last.get('saved'))
+			elif 'hit' in rdf.cache.last:
+				msg += u' (cache *miss*)'
+			return msg
 		else:
 			# if parse attempt failed,
 			# return failure msg
@@ -217,6 +233,32 @@ def parse_rdf(*args, **kwargs):
 	return u"!Didn't read source:! No location specified."
 
 
+# stream large dump into graph
+def import_rdf(*args, **kwargs):
+	"""\
+	Imports a local N-Triples or N-Quads file into a graph
+	incrementally, inserting statements in batches of fixed size.
+	Memory usage does not depend on the size of the file, so this
+	is the command to fill sqlite-backed graphs with large dumps.
+
+	handles:
+	`import <resource> into <graph>`
+	`import <resource> into <graph> batch <batchsize>`
+	"""
+	location = kwargs.get('resource')
+	name = kwargs.get('graph')
+	batch = kwargs.get('batchsize')
+	if batch:
+		batch = int(batch)
+	res = rdf.import_resource(location, name=name, batch=batch)
+	if type(res) is str:
+		return res
+	g, count, size, seconds = res
+	return u'Imported {} rdf statements ({:.1f} MB) from {} into graph "{}" in {:.1f}s ({:.0f} triples/s).'.format(
+		count, size/1024.**2, location, rdf.graph_name(g), seconds,
+		count/max(seconds, 1e-6))
+
+
 # show info about given graph
 #FIXME: this was nice as a lorem ipsum interaction dummy, but seriously...
 def graph_info(*args, **kwargs):
@@ -224,7 +266,7 @@ def graph_info(*args, **kwargs):
 	Possible keywords: size, ...
 	"""
 	field = kwargs.get('attribute')
-	name = kwargs.get('graphname')
+	name = kwargs.get('graph')
 	if None in [field, name]:
 		return "!!Error!!. Can't find attribute {} for graph {}".format(
 			field, name)
@@ -247,7 +289,7 @@ def show_ns(*args, **kwargs):
 	#manager!!
 	head = 'currently bound namespaces:'
 	if not 'namespace' in kwargs:
-		g = rdf.get_graph(kwargs.get('graphname'))
+		g = rdf.get_graph(kwargs.get('graph'))
 		if g:
 			res = ['{}:{}'.format(ns, url) for ns,url in g.namespaces()]
 		else:
@@ -269,27 +311,50 @@ def show_ns(*args, **kwargs):
 	return '\n'.join([head]+res)
 
 
+# download namespace documents for offline use
+def prefetch_ns(*args, **kwargs):
+	"""Fills the local cache of namespace vocabulary documents, so that
+	they are available without network access later.
+	handles:
+	`prefetch namespaces`"""
+	res = ['Namespace documents in {}:'.format(rdf.remote.cachedir)]
+	for name, url, status, size in rdf.ns.prefetch():
+		if status:
+			res.append('{}:{} *{}* ({} bytes)'.format(name, url, status, size))
+		else:
+			res.append('{}:{} !failed!'.format(name, url))
+	return '\n'.join(res)
+
+
 # find triples containing specific term
-#FIXME: come on!
 def find_term_ls(*args, **kwargs):
-	"""Find triples with the given term.
+	"""Find triples with the given term. Lines are generated while
+	being displayed; `limit` and `offset` select a range of them.
 	handles:
 	`find <rdfentity>`
 	`find <rdfentity> <graph>`
-	`ls <graph>`"""
+	`find <rdfentity> limit <limit>`
+	`find <rdfentity> limit <limit> offset <offset>`
+	`ls <graph>`
+	`ls <graph> limit <limit>`
+	`ls <graph> limit <limit> offset <offset>`"""
 	rdfentity = kwargs.get('rdfentity')
-	g = rdf.get_graph(kwargs.get('graphname'))
+	g = rdf.get_graph(kwargs.get('graph'))
 	# `find` command
 	if rdfentity:
 		if ':' in rdfentity:
-			ns, term = rdfentity.split(':')
+			ns, term = rdfentity.split(':', 1)
 		else:
 			ns, term = None, rdfentity
-		return '\n'.join(rdf.find_term(term, nsp=ns, g=g))
+		res = rdf.find_term(term, nsp=ns, g=g)
 	else:
 		# `ls` command
-		res = rdf.ls_rdf(g=g)
-	return '\n'.join([u'({} {} {})'.format(*t) for t in res])
+		res = (u'({} {} {})'.format(*t) for t in rdf.ls_rdf(g=g))
+	offset = int(kwargs.get('offset', 0))
+	limit = kwargs.get('limit')
+	if limit is not None:
+		limit = offset + int(limit)
+	return itertools.islice(res, offset, limit)
 
 
 # bind a new namespace
@@ -301,7 +366,7 @@ def bind_ns(*args, **kwargs):
 	`bind <namespace> <nsurl> <graph>`"""
 	nsn = kwargs.get('namespace')
 	url = kwargs.get('nsurl')
-	g = rdf.get_graph(kwargs.get('graphname'))
+	g = rdf.get_graph(kwargs.get('graph'))
 	if not g:
 		g = rdf.__dict__.get('current_graph')
 	if g:
@@ -310,7 +375,6 @@ def bind_ns(*args, **kwargs):
 			nns = 'Bound namespace {}:{} to graph {}.'.format(nns.name,
 				nns.url, rdf.graph_name(g))
 		rdf.ns.reg_graph(g)
-		rdf.extract_ns_terms(g)
 		return nns
 
 
@@ -327,31 +391,28 @@ def cp_graph(*args, **kwargs):
 	if len(args) == 2:
 		name1, name2 = args[:2]
 		g1 = rdf.get_graph(name1)
-		g1, g2 = [rdf.get_graph(n) for n in args[:2]]
 	elif len(args) == 1:
 		g1 = rdf.current_graph
-		name2 = kwargs.get('graphname')
-		g2 = rdf.get_graph(name2)
+		name2 = kwargs.get('graph')
 	else:
 		return '!!Error!!: Parameter count mismatch ({}).'.format(
 			len(args))
-	# do copying
-	if not g2:
-		g2 = rdf.create_graph(name2)
-	else:
-		return "!Didn't copy!: Graph {} exists. Delete it first.".format(name2)
-	if not None in [g1, g2]:
-		# format MUST be pretty-xml, since xml ignores triples
-		contents = g1.serialize(format='pretty-xml')
-		g2.parse(data=contents)
-		return ''.join([
-			"Created copy of graph '{}' under name '{}' ".format(
-				rdf.graph_name(g1), name2),
-			" with {} triples.".format(len(g2)),
-			'\n{}'.format(rdf.repr_graph(g2))])
-	else:
+	if g1 is None:
 		return "!!Error!!: Couldn't copy graph '{}' to name '{}'!".format(
 			rdf.graph_name(g1), name2)
+	# do copying
+	if rdf.get_graph(name2) is not None:
+		return "!Didn't copy!: Graph {} exists. Delete it first.".format(name2)
+	res = rdf.copy_graph(g1, name2)
+	if type(res) is str:
+		return res
+	g2, count, seconds, method = res
+	return ''.join([
+		"Created copy of graph '{}' under name '{}' ".format(
+			rdf.graph_name(g1), name2),
+		"with {} triples in {:.2f}s ({}).".format(len(g2), seconds,
+			['streamed', 'copied in database'][int(method == 'sql')]),
+		'\n{}'.format(rdf.repr_graph(g2))])
 
 
 # insert one graph into another
@@ -359,33 +420,39 @@ def cp_graph(*args, **kwargs):
 # https://rdflib.readthedocs.org/en/latest/intro_to_graphs.html#set-operations-on-rdflib-graphs
 def merge_graph(*args, **kwargs):
 	"""merge graph into :data:`.rdf.current_graph`.
+	Statements are inserted in batches of `batchsize` triples, within
+	one transaction for SQL-backed graphs, or by the database itself if
+	both graphs live in the same one (see :func:`.rdf.merge_graph`).
 	handles:
 	`merge <graph>`
-	`insert <graph> into <graph>`"""
+	`merge <graph> batch <batchsize>`
+	`insert <graph> into <graph>`
+	`insert <graph> into <graph> batch <batchsize>`"""
+	batch = kwargs.get('batchsize')
+	if batch:
+		args = args[:-1]
+		batch = int(batch)
 	if len(args) > 0:
 		# currently selected graph, command probably was merge
 		if len(args) < 2:
 			g = rdf.current_graph
-			name = kwargs.get('graphname')
-			if name:
-				# graph specified by parameter
-				g2 = rdf.get_graph(name)
+			names = [args[0]]
+			g2 = rdf.get_graph(args[0])
 		# two specified graphs, command probably was insert
 		else:
-			g2, g = [rdf.get_graph(n) for n in args[:2]]
+			names = args[:2]
+			g2, g = [rdf.get_graph(n) for n in names]
 		# in case of wrong graphname(s), print warning.
-		if None in [g,g2]:
-			for g in [g for g in [g, g2] if g is None]:
-				msg = 'Could not find graph "{}"'.format(name)
+		if g is None:
+			msg = 'No graph to merge into'
+		elif g2 is None:
+			msg = 'Could not find graph "{}"'.format(names[0])
 		else:
 			# actual merge:
-			for ns,url in g2.namespaces():
-				g.bind(ns, str(url))
-			# copy triples from g2 into currently active graph
-			for triple in g2:
-				g.add(triple)
-			return 'Merged {} triples from {} into {}, resulting in {}.'.format(
-				len(g2), g2.identifier, g.identifier, len(g))
+			count, seconds, method = rdf.merge_graph(g2, g, batch=batch)
+			return 'Merged {} triples from {} into {} in {:.2f}s ({}), {} of them new, resulting in {}.'.format(
+				len(g2), g2.identifier, g.identifier, seconds,
+				['batched', 'in database'][int(method == 'sql')], count, len(g))
 	# not enough parameters?
 	else:
 		msg = 'Parameter count mismatch ({}).'.format(len(args))
@@ -397,7 +464,7 @@ def merge_graph(*args, **kwargs):
 def import_namespaces(*args, **kwargs):
 	"""Download namespaces for given graph name.
 	"""
-	name = kwargs.get('graphname')
+	name = kwargs.get('graph')
 	if name:
 		g = rdf.get_graph(name)
 	else:
@@ -414,18 +481,50 @@ def import_namespaces(*args, **kwargs):
 
 # set sqlite resource as persistent store
 def store_sqlite(*args, **kwargs):
-	"""Set sqlite as store for graph."""
-	name = kwargs.get('graphname')
+	"""Set sqlite as store for graph, tuned by given profile
+	(see :data:`.storage.profiles`)."""
+	name = kwargs.get('graph')
 	filename = kwargs.get('sqlite')
-	g, store = rdf.store_sqlite(name, filename)
+	g, store = rdf.store_sqlite(name, filename, profile=kwargs.get('profile'))
 	msg = rdf.repr_graph(g)+' at '+ store.configuration
-	return msg + ' updated. Size: {}.'.format(len(g))
+	return msg + ' updated. Size: {}. Profile: *{}*.'.format(len(g),
+		rdf.storage.tuning(store))
+
+
+# set dictionary-encoded sqlite database as store
+def store_native(*args, **kwargs):
+	"""Set sqlite database as store for graph, keeping terms in a
+	dictionary and statements as integer IDs (see :mod:`.sqlstore`).
+	handles:
+	`create <graph> store sqlite <sqlite> native`
+	`create <graph> store sqlite <sqlite> native profile <profile>`
+	`connect <graph> to sqlite <sqlite> native`
+	`connect <graph> to sqlite <sqlite> native profile <profile>`"""
+	name = kwargs.get('graph')
+	filename = kwargs.get('sqlite')
+	g, store = rdf.store_sqlite(name, filename, profile=kwargs.get('profile'),
+		native=True)
+	msg = rdf.repr_graph(g)+' at '+ store.configuration
+	return msg + ' updated. Size: {}. Profile: *{}*.'.format(len(g),
+		rdf.storage.tuning(store))
+
+
+# create graph in compact in-memory store
+def store_compact(*args, **kwargs):
+	"""Create graph kept in memory as sorted arrays of integer
+	term IDs (see :mod:`.compact`).
+	handles:
+	`create <graph> store compact`"""
+	g = rdf.create_graph(kwargs.get('graph'), store=rdf.compact.plugin)
+	if type(g) is str:
+		return g
+	return rdf.repr_graph(g)
 
 
 
 def store_xml(*args, **kwargs):
 	"""Save contents of a graph to an `xml` file."""
-	name = kwargs.get('graphname')
+	name = kwargs.get('graph')
 	filename = kwargs.get('filename')
 	if name:
 		g = rdf.get_graph(name)
@@ -442,7 +541,7 @@ def add_stm(*args, **kwargs):
 	`add <rdfentity> <rdfrelation> <rdfentity>`
 	`add <rdfentity> <rdfrelation> <rdfentity> <graph>`"""
 	if len(args)>3:
-		name, subj, prop, obj = args
+		subj, prop, obj, name = args
 		g = rdf.get_graph(name)
 	else:
 		subj, prop, obj = args
@@ -450,5 +549,6 @@ def add_stm(*args, **kwargs):
 	if g:
 		triple = tuple([rdf.expand_term(i) for i in (subj,prop,obj)])
 		g.add(triple)
+		rdf.added(g, [triple])
 		# TODO: implement!
 		return triple
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Measurement of command execution, as requested by prefixing a
+command with ``time`` or ``profile`` (see :data:`.prefixes`).
+
+Both wrap the call of the command's handler function in
+:func:`~.commands.execute`, so they work with any registered command.
+``time <command>`` reports wall clock and CPU time, and how much of it
+went to the handler and how much to printing its output (in the shell,
+:func:`.prompt.display`). ``profile <command>`` runs the handler under
+`cProfile` and lists the functions it spent most time in.
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import io
+import time
+import pstats
+import cProfile
+
+top = 20
+"""Number of functions listed by :func:`profiled`."""
+
+sortby = 'cumulative'
+"""Key by which :func:`profiled` sorts functions (see `pstats`)."""
+
+
+# lines of handler output
+def _lines(ret):
+	if type(ret) is list:
+		return ret
+	try:
+		if iter(ret) is ret:
+			return ret
+	except TypeError:
+		pass
+	if ret is None:
+		return []
+	return u'{}'.format(ret).split('\n')
+
+
+# time handler and output
+def timed(handler, args, kwargs):
+	"""Calls `handler` and returns a generator of its output lines,
+	followed by a report of the time it took to compute and print them.
+
+	Handlers may return generators, which compute their output
+	only as it is being printed. Time spent in fetching the next line
+	from such output counts as handler time, everything in between
+	(highlighting, paging, writing) as display time. Measurement ends
+	when the last line has been taken, so writing the last buffered
+	chunk of output is not included.
+	"""
+	start, cpu = (time.time(), time.process_time())
+	ret = handler(*args, **kwargs)
+	spent = time.time() - start
+	return _report(iter(_lines(ret)), start, cpu, spent)
+
+
+# pass through output lines, then report timing
+def _report(lines, start, cpu, spent):
+	count = 0
+	while True:
+		t = time.time()
+		try:
+			line = next(lines)
+		except StopIteration:
+			break
+		spent += time.time() - t
+		count += 1
+		yield line
+	wall = time.time() - start
+	yield u'*time*: {:.3f}s wall, {:.3f}s CPU; handler {:.3f}s, display {:.3f}s ({} lines).'.format(
+		wall, time.process_time() - cpu, spent, wall - spent, count)
+
+
+# profile handler
+def profiled(handler, args, kwargs):
+	"""Calls `handler` under `cProfile` and returns its output lines,
+	followed by the :data:`top` functions by :data:`sortby` time.
+	Output returned as a generator is computed while profiling."""
+	prof = cProfile.Profile()
+	prof.enable()
+	try:
+		ret = handler(*args, **kwargs)
+		lines = list(_lines(ret))
+	finally:
+		prof.disable()
+	stream = io.StringIO()
+	stats = pstats.Stats(prof, stream=stream)
+	stats.strip_dirs().sort_stats(sortby).print_stats(top)
+	report = [l for l in stream.getvalue().split('\n') if l.strip()]
+	return lines + [u'*profile*: top {} functions by {} time:'.format(
+		top, sortby)] + report
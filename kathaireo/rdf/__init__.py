@@ -14,14 +14,25 @@ calling :func:`.import_ns`.
 __docformat__ = "restructuredtext en"
 __version__ = "0.0.16c-dev"
 
+import io
 import os
+import glob
 import rdflib
 import re
+import time
 import codecs
+import contextlib
+import multiprocessing
+from concurrent import futures
 
 from . import namespaces as ns
 from . import storage
+from . import sqlstore
+from . import compact
 from . import remote
+from . import cache
+from . import formats
+from . import search
 
 
 # directory of existing rdflib.Graph instances, identified
@@ -33,6 +44,19 @@ _graphs={}
 # struct: {graphname: [term, term, ...], graphname: [...]}
 _terms={}
 
+workers=None
+"""Number of processes parsing files in parallel when a directory or glob
+pattern is loaded. Defaults to the number of CPUs if `None`."""
+
+version=0
+"""Incremented whenever a graph is created, selected or changed, so that
+whatever has been derived from graph contents can tell it's outdated."""
+
+loaded=[]
+"""Files read by the most recent call of :func:`load_files`. Each one
+is listed as a dictionary with keys ``location``, ``seconds``, ``cached``
+and, if reading succeeded, ``triples``."""
+
 
 #TODO: offer rdflib set operations using exact same syntax?
 # (g1 + g2, g1 += g2, g1 & g2, ...)
@@ -65,7 +89,9 @@ def set_graph(g):
 	value is omitted to work on said current default.
 	:param g: new default graph. May be ``None``.
 	:returns: status message."""
+	global version
 	globals()['current_graph'] = g
+	version += 1
 	if g is None:
 		return 'Unset current graph'
 	return u'Select graph: {}'.format(repr_graph(g))
@@ -75,34 +101,30 @@ def set_graph(g):
 # list all triples in graph
 def ls(g=None):
 	"""
-	Returns a list of strings, each one representing one RDF triple of the given
+	Yields strings, each one representing one RDF triple of the given
 	graph. Triple's URIs are substituted by their corresponding namespace-relative
 	``ns:term`` `qualified name`_ identifiers as returned by
 	``Graph.namespace_manager.qname``.
 	.. _qualified name: http://www.w3.org/TR/1999/REC-xml-names-19990114/#NT-QName
 	:param g: ``rdflib.Graph`` instance
-	:returns: list of strings
+	:returns: generator of strings
 	"""
 	# TODO: this is a generic operation. make retrieval of default graph reusable
 	if g is None:
 		g = globals().get('current_graph')
 	if g is None:
-		return ['Error']
-	# TODO: test, handle namespaces, handle urls
-	res=[] # string list
-	trp=[] # list of triples in str repr
-	# FIXME: fails on invalid identifiers: with no base url
-	# available, rdflib.split_uri throws exception. catch it!
+		yield 'Error'
+		return
 	for triple in g:
-		res.append([g.namespace_manager.qname(t) for t in triple])
-	if len(trp)>0:
-		clmwidths=[ # determine column widths
-				max([len(triple[i]) for triple in trp]) for i in [0,1,2]]
-		# align triple strings
-		tmpl='{{:<{}}} {{:^{}}} {{:>{}}}'.format(*clmwidths)
-		for triple in trp:
-			res.append('{} {} {}'.format(*triple))
-	return res
+		qnames = []
+		for t in triple:
+			# rdflib.split_uri throws exception on identifiers
+			# without base url
+			try:
+				qnames.append(g.namespace_manager.qname(t))
+			except Exception:
+				qnames.append(render_node(t))
+		yield ' '.join(qnames)
 
 
 
@@ -115,11 +137,15 @@ def ls(g=None):
 def create_graph(name, store='default'):
 	"""Returns a new `.rdflib.Graph` instance with the
 	given identifier, if said identifier has not already
-	been given to an existing graph."""
+	been given to an existing graph. `store` is either a store
+	instance or the name of an `rdflib` store plugin, such as
+	``'kathaireo-sqlite'`` (see :mod:`.sqlstore`) or ``'kathaireo-compact'``
+	(see :mod:`.compact`)."""
 	# FIXME: if no graph selected so far, select newly created one
 	if not name in _graphs:
 		g = rdflib.Graph(store=store, identifier=name)
 		_graphs[name] = g
+		touch(g)
 		return g
 	return "!Warning!: graph '{}' already exists.".format(name)
 
@@ -141,14 +167,19 @@ def repr_graph(g):
 
 
 # import rdf data from resource into graph
-def load_resource(location, name=None):
+def load_resource(location, name=None, workers=None):
 	"""Loads rdf graph at location (file/url) and names it.
 	Reuses (overwrites?) an existing graph if one going by the given name
 	is known, creates a new instance if not.
 	Returns whatever graph instance the resource in question
 	is being read into.
-	If parsing fails, a new attempt is made using another mimetype
-	(:data:`.remote.mimetypes`). If `location` does not seem to
+	Contents of local files are restored from the :mod:`.cache`
+	if the file has been parsed before and hasn't changed since.
+	Otherwise, the source format is determined by the :mod:`.formats`
+	module and the resource is parsed once. `location` may also be a
+	directory or a glob pattern, in which case all files found are
+	parsed by up to `workers` processes (see :func:`load_files`).
+	If `location` does not seem to
 	point to a local file, an attempt is made to start a download from that
 	location via :func:`.remote.parse`.
 	If everything fails, `None` is returned.
@@ -160,7 +191,8 @@ def load_resource(location, name=None):
 	if name:
 		g = get_graph(name)
 		# if name is wrong/no graph is found, create one.
-		if not g:
+		# (an empty graph is falsy, so compare to None)
+		if g is None:
 			g = create_graph(name)
 	# if no name is given, operate on active graph selected by set_graph
 	else:
@@ -173,53 +205,190 @@ def load_resource(location, name=None):
 	if g != None and isinstance(g, rdflib.Graph):
 		#print 'importing into graph {}'.format(repr_graph(g))
 		#TODO: make use of `publicID`: the logical URI to use as the document base.
-		if os.path.exists(location) and os.path.isfile(location):
+		files = local_files(location)
+		if len(files) > 0:
 			#print 'resource appears to be a local file.'
-			# if source is local file, try to autodetect format,
-			# then suggest default mimetypes if that fails.
-			for mime in [None]+remote.mimetypes[:3]:
-				try:
-					# call rdflib graph parse method
-					#print 'apply format {} to file {}.'.format(mime, location)
-					print('parsing attempt using mimetype: ', mime)
-					#f = codecs.open(location, encoding='utf-8', mode='rb')
-					g = g.parse(location, format=mime)
-					#f.close()
-				except:
-					pass
-				if g:
-					try:
-						# register namespaces
-						print('register namespaces bound by graph')
-						ns.reg_graph(g)
-					except Exception as e:
-						print(e.message)
-						print(e)
-					try:
-						print('populate namespace container with terms discovered in graph.')
-						extract_ns_terms(g)
-						return g
-					except Exception as e:
-						#print 'source apparently no {}.'.format(mime)
-						print(e.message)
-						print(e)
-						pass
-			# if none of the default formats could be recognized in
-			# source, return None
-			return None
+			# namespaces and terms are registered as files are read
+			if load_files(g, files, workers=workers) < 1:
+				# if none of the files could be parsed, return None
+				return None
+			return g
 		# if source is not a file on disk:
 		else:
 			# try to load from internet
 			#print 'resource is no local file! download from {}.'.format(location)
-			g = remote.parse(g, location)
-			ns.reg_graph(g)
-			extract_ns_terms(g)
+			cache.last.clear()
+			formats.last.clear()
+			del loaded[:]
+			tmp = remote.parse(rdflib.Graph(), location)
+			if tmp is None:
+				return None
+			triples = list(tmp)
+			_ingest(g, triples, list(tmp.namespaces()))
+			_registered(g, triples)
 		#print "parsed contents at {} into {}.".format(
 			#location, g)
 	# return graph resource content went in
 	return g
 
 
+# list local files denoted by location
+def local_files(location):
+	"""Returns a list of local files `location` refers to. This is
+	either the file at `location` itself, the RDF files (as recognized
+	by their extension, see :data:`.formats.extensions`) within a
+	directory, or those matching a glob pattern.
+	An empty list means that `location` is not local."""
+	if os.path.isfile(location):
+		return [location]
+	if os.path.isdir(location):
+		return sorted([os.path.join(location, fn) for fn in os.listdir(location)
+			if os.path.splitext(fn)[1].lower() in formats.extensions
+			and os.path.isfile(os.path.join(location, fn))])
+	if any([c in location for c in '*?[']):
+		return sorted([fn for fn in glob.glob(location) if os.path.isfile(fn)])
+	return []
+
+
+# parse local file, to be run in worker processes
+# (output is handed back to be printed by the parent)
+def _parse_file(location):
+	start = time.time()
+	out = io.StringIO()
+	with contextlib.redirect_stdout(out):
+		tmp = parse_local(location)
+	if tmp is None:
+		return (location, None, None, time.time()-start, formats.last.copy(),
+			out.getvalue())
+	return (location, list(tmp), list(tmp.namespaces()), time.time()-start,
+		formats.last.copy(), out.getvalue())
+
+
+# context for worker processes, which aren't forked from this one,
+# where background threads might hold locks
+def _mp_context():
+	methods = multiprocessing.get_all_start_methods()
+	return multiprocessing.get_context(
+		'forkserver' if 'forkserver' in methods else 'spawn')
+
+
+# load multiple local files
+def load_files(g, files, workers=None):
+	"""Reads the contents of local files into graph `g`. Files found
+	in the :mod:`.cache` are restored from there; the others are parsed
+	in a pool of `workers` processes (default: :data:`workers`) and cached.
+	Triples and namespace bindings are merged into `g` as they come in.
+	Namespaces are registered and terms extracted once all files have
+	been merged, so that terms of a file are indexed under namespaces
+	bound by another.
+	How each file was read and how long it took is recorded in
+	:data:`loaded`.
+
+	:returns: number of files successfully read
+	"""
+	del loaded[:]
+	formats.last.clear()
+	pending = []
+	merged = []
+	# restore previously parsed contents from cache, if
+	# file hasn't changed since
+	for location in files:
+		start = time.time()
+		snapshot = cache.lookup(location)
+		if snapshot is None:
+			pending.append(location)
+		else:
+			_ingest(g, *snapshot)
+			merged.append(snapshot[0])
+			loaded.append({'location': location, 'triples': len(snapshot[0]),
+				'seconds': time.time()-start, 'cached': True})
+	# parse the rest
+	workers = workers or globals().get('workers') or os.cpu_count() or 1
+	if len(pending) > 1 and workers > 1:
+		pool = futures.ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+			mp_context=_mp_context())
+		results = pool.map(_parse_file, pending)
+	else:
+		pool = None
+		results = map(_parse_file, pending)
+	try:
+		for location, triples, bindings, seconds, fmt, output in results:
+			print(output, end='')
+			entry = {'location': location, 'seconds': seconds, 'cached': False}
+			entry.update(fmt)
+			if triples is not None:
+				cache.store(location, triples, bindings, parsetime=seconds)
+				_ingest(g, triples, bindings)
+				merged.append(triples)
+				entry['triples'] = len(triples)
+			loaded.append(entry)
+	finally:
+		if pool:
+			pool.shutdown()
+	_registered(g, [t for triples in merged for t in triples])
+	return len([e for e in loaded if 'triples' in e])
+
+
+# insert parsed contents into graph
+def _ingest(g, triples, bindings):
+	for prefix, url in bindings:
+		g.bind(prefix, url)
+	g.addN([(s,p,o,g) for s,p,o in triples])
+
+
+# register namespaces, then index the terms just added
+def _registered(g, triples):
+	ns.reg_graph(g)
+	added(g, triples)
+
+
+# stream line-based rdf dump into graph
+def import_resource(location, name=None, batch=None):
+	"""Imports a local N-Triples or N-Quads file into the graph
+	identified by `name` (or the current graph) using
+	:func:`.storage.stream_import`. Unlike :func:`load_resource`, the
+	file is never held in memory as a whole, and statements are inserted
+	in transactional batches of `batch` triples, which makes this the
+	way to fill sqlite-backed graphs (see :func:`store_sqlite`) with large
+	dumps. A graph going by `name` is created if it doesn't exist.
+
+	:returns: tuple ``(graph, triples, bytes, seconds)``, or an error message
+	"""
+	if name:
+		g = get_graph(name)
+		if g is None:
+			g = create_graph(name)
+	else:
+		g = globals().get('current_graph')
+	if g is None:
+		return '!Error!: No graph to import into.'
+	if not os.path.isfile(location):
+		return '!Error!: {} is not a local file.'.format(location)
+	fmt, confidence = formats.detect(location,
+		head=formats.read_head(location))
+	if not fmt in ['nt', 'nquads']:
+		return '!Error!: Streaming import reads N-Triples or N-Quads, not {}.'.format(fmt)
+	return (g,)+storage.stream_import(g, location, format=fmt, batch=batch,
+		callback=lambda quads: added(g, quads))
+
+
+# parse local file into new in-memory graph
+def parse_local(location):
+	"""Parses the local file at `location` into a new in-memory
+	``rdflib.Graph``. The parser is picked once, based on the format
+	detected by :func:`.formats.detect`, so a failing attempt costs a single
+	pass. Returns `None` if parsing fails."""
+	fmt, confidence = formats.detect(location,
+		head=formats.read_head(location))
+	print('parse using format {} (confidence {:.2f})'.format(fmt, confidence))
+	tmp = rdflib.Graph()
+	try:
+		return tmp.parse(location, format=fmt)
+	except Exception as e:
+		print(e)
+	return None
+
+
 # info output templates
 rdfinfotempl={"size": "Number of statements in graph '{}': {}",
 	"namespaces": "Graph '{}' binds the following namespaces:\n{}",
@@ -282,6 +451,9 @@ def bind_ns(g, name, url):
 	if not None in [g, name, url]:
 		nns = ns.create(name, url)
 		g.bind(name, rdflib.namespace.Namespace(url))
+		# terms of other namespaces are indexed already, those of
+		# this one when they are looked up
+		nns.defer(g)
 		return nns
 	return '!Error!: could not bind new namespace.'
 
@@ -306,9 +478,7 @@ def shorten_url(url):
 	"""Shortens a given url by collapsing it to a pair
 	of identifiers denoting namespace and term, like
 	``rdfs:label``."""
-	#TODO: impl
-	base, term = struct_uri(url)
-	nspc = ns.get_ns(base)
+	nspc, term = ns.split(url)
 	if nspc:
 		return '{}:{}'.format(nspc.name, term)
 	# TODO: if no namespace is present, shorten shomehow else
@@ -326,100 +496,147 @@ def expand_term(token):
 
 
 #harvest namespace terms from graph
-def extract_ns_terms(g):
+def extract_ns_terms(g, triples=None):
 	"""Collects terms from graph rdf and assigns them
-	to the namespaces they come from."""
-	# TODO: filtern, so dasz einzelne namespaces bearbeitet weden
-	# koennen; self.rdf in namespace klasse damit befuellen.
-	for t in g:
-		for u in t:
-			if u:
-				url, term = struct_uri(u)
-				if term:
-					nsp = ns.get_ns(url)
-					if nsp:
-						#print '\n\nextract namespace term from rdf data:',
-						#print '{}..{}'.format(url[:10],url[-10:]), nsp.name, term
-						dest = [nsp.classes, nsp.properties][int(term.islower())]
-						if not term in dest:
-							dest.append(term)
+	to the namespaces they come from, using :func:`.namespaces.index`.
+	If `triples` is given, only those are examined, which should be the
+	ones just added to the graph.
+
+	:returns: number of new index entries
+	"""
+	if triples is None:
+		triples = g
+	return ns.index(triples)
 
 # TODO: we dont need this. rdflib
 # URIRef.n3(...)
 def ls_rdf(g=None):
-	"""Returns rdf content of graph line by line as tuples."""
+	"""Yields rdf content of graph line by line as tuples."""
 	if not g:
 		g = globals().get('current_graph')
 	if g:
-		stms = []
 		for trp in g:
-			stm = ()
-			for t in trp:
-				if re.match('^((?:\S*\"[^"]+\")+|\S+)$', t):
-					stm += (t,)
-				else:
-					stm += (u'"{}"'.format(t),)
-			stms.append(stm)
-		return stms
+			yield tuple([render_node(t) for t in trp])
 
 
+# quote node if necessary
+def render_node(t):
+	"""Returns a node as it is displayed in triple listings, which
+	means that text containing white space gets quoted."""
+	if re.match('^((?:\S*\"[^"]+\")+|\S+)$', t):
+		return t
+	return u'"{}"'.format(t)
 
 
-# TODO: check out rdflib.
-# FIXME: either use slicing: g[:foaf.knows]
-# or functions like g.subject_objects(pred), ...
+
+
+# find triples by looking up uris in the graph's search index
 def find_term(term, nsp=None, g=None):
-	"""Shows triple containing given term."""
+	"""Shows triples containing URIs whose local name begins with
+	`term`. If the name of a namespace `nsp` is given, only URIs
+	within that namespace are considered. Matching URIs are looked
+	up in the :mod:`.search` index of the graph, which gets built
+	on first use, and highlighted in the triples returned.
+
+	:returns: generator of lines
+	"""
 	if not g:
 		g = globals().get('current_graph')
 	if g:
-		res = []
+		url = None
 		if nsp != None and nsp in ns.get_names():
-			res.extend(['Search for occurences of resouce id {}:{} in {}'.format(
-				ns.get(nsp).name, term, graph_name(g))])
-			prefix = ns.get(nsp).url
-			nsp = None
-		else:
-			prefix = '\S*'
-		pttn = '{}[#/]?{}'.format(prefix, term)
-		query = re.compile(pttn)
-		#print query.pattern
-		# substitution string for query matches
-		if nsp:
-			if term:
-				subst = u'*{}:{}*'.format(nsp,term)
-			else:
-				subst = u'*{}*'.format(nsp)
-		else:
-			subst = u'*:{}*'.format(term)
-		# serach through triple list
-		for trp in ls_rdf(g=g):
-			stm = u'{} {} {}'.format(*trp)
-			#if stm.find('Glenys Stacey') > 0:
-				#print stm
-				#res.append(stm)
-			# occurence of desired ref entity?
-			occ = query.findall(stm)
-			if len(occ)>0:
-				for o in occ:
-					stm = re.sub(pttn, subst, stm)
-				res.append(stm)
-		return res
-
-
+			yield 'Search for occurences of resouce id {}:{} in {}'.format(
+				ns.get(nsp).name, term, graph_name(g))
+			url = ns.get(nsp).url
+		triples, uris = search.find(g, term=term or '', url=url)
+		for trp in triples:
+			yield u' '.join([[render_node(t), u'*{}*'.format(
+				shorten_url(t))][int(t in uris)] for t in trp])
+
+
+# mark graph as changed
+def touch(g):
+	"""To be called after statements have been added to or
+	removed from `g`. Invalidates the graph's :mod:`.search` index."""
+	global version
+	version += 1
+	search.touch(g)
+
+
+# update indices with new statements
+def added(g, triples):
+	"""To be called with the statements just added to `g`. Keeps
+	the graph's :mod:`.search` data and the terms of
+	:mod:`.namespaces` up to date (see :func:`extract_ns_terms`)."""
+	global version
+	version += 1
+	search.add(g, triples)
+	extract_ns_terms(g, triples)
+
+
+# copy graph under new name
+def copy_graph(g, name, batch=None):
+	"""Creates a graph going by `name` and copies the namespace bindings
+	and statements of graph `g` into it using :func:`.storage.copy`.
+	If `g` is kept in an SQL database (see :func:`store_sqlite`), the copy
+	is created in the same database, which copies the statements itself.
+	Otherwise, they are streamed into a new in-memory graph in batches
+	of `batch` triples, which is kept by a :class:`.compact.CompactStore`
+	if `g` is.
+
+	:returns: tuple ``(graph, triples, seconds, method)``, or an error message
+	"""
+	if name in _graphs:
+		return "!Warning!: graph '{}' already exists.".format(name)
+	store = 'default'
+	if isinstance(g.store, (storage.SQLAlchemy, storage.SQLiteStore)):
+		store = g.store
+	elif isinstance(g.store, compact.CompactStore):
+		store = compact.plugin
+	g2 = create_graph(name, store=store)
+	count, seconds, method = storage.copy(g, g2, batch=batch, progress=True,
+		callback=lambda quads: added(g2, quads))
+	if method == 'sql':
+		added(g2, g2)
+	ns.reg_graph(g2)
+	return (g2, count, seconds, method)
+
+
+# merge graph into another
+def merge_graph(src, dst, batch=None):
+	"""Adds the namespace bindings and statements of graph `src` to
+	graph `dst` using :func:`.storage.copy`, which has them inserted
+	by the database if both graphs live in the same one, or inserts
+	them in batches of `batch` triples, within one transaction if `dst`
+	is kept in an SQL database.
+
+	:returns: tuple ``(triples, seconds, method)``, where `triples` is
+		the number of statements `dst` has gained
+	"""
+	res = storage.copy(src, dst, batch=batch, progress=True,
+		callback=lambda quads: added(dst, quads))
+	if res[2] == 'sql':
+		added(dst, src)
+	ns.reg_graph(dst)
+	return res
 
 
 # attach sqlite store
-def store_sqlite(name, filename):
+def store_sqlite(name, filename, profile=None, native=False):
 	"""Store. Sqlite. database. Uses the :mod:`.storage` module.
-	Overwites graph referenced by `name`.
+	Overwites graph referenced by `name`. Connections to the database
+	are tuned according to `profile` (see :data:`.storage.profiles`).
+	If `native` is set, the graph is kept by a dictionary-encoded
+	:class:`.sqlstore.SQLiteStore`, otherwise by `rdflib_sqlalchemy`.
 	"""
 	#g = get_graph(name)
 	#if g:
-	store = storage.sqlite(filename)
+	store = storage.sqlite(filename, native=native)
 	g = rdflib.Graph(store, name)
-	g.open(store.configuration)
+	g.open(store.configuration, create=True)
+	storage.tune(store, profile)
 	_graphs[name] = g
+	touch(g)
 	return (g, store)
 
 
@@ -0,0 +1,46 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Namespace bindings for `rdflib` stores which keep them in memory.
+
+:class:`Bindings` implements the namespace methods of an `rdflib`
+``Store`` the way its ``Memory`` store does, and is shared by the
+stores in :mod:`.sqlstore` and :mod:`.compact`.
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+
+# namespace bindings kept in memory
+class Bindings(object):
+	"""Mixin for stores, keeping their namespace bindings in dictionaries
+	``_namespaces`` (by prefix) and ``_prefixes`` (by namespace), which
+	the store has to create."""
+	def bind(self, prefix, namespace, override=True):
+		# same as rdflib.plugins.stores.memory.Memory.bind
+		bound_namespace = self._namespaces.get(prefix)
+		bound_prefix = self._prefixes.get(namespace)
+		if bound_prefix is None and bound_namespace is not None:
+			bound_prefix = self._prefixes.get(bound_namespace)
+		if override:
+			if bound_prefix is not None:
+				self._namespaces.pop(bound_prefix, None)
+			if bound_namespace is not None:
+				self._prefixes.pop(bound_namespace, None)
+			self._prefixes[namespace] = prefix
+			self._namespaces[prefix] = namespace
+		else:
+			ns = bound_namespace if bound_namespace is not None else namespace
+			p = bound_prefix if bound_prefix is not None else prefix
+			self._prefixes[ns] = p
+			self._namespaces[p] = ns
+
+	def namespace(self, prefix):
+		return self._namespaces.get(prefix)
+
+	def prefix(self, namespace):
+		return self._prefixes.get(namespace)
+
+	def namespaces(self):
+		for prefix, namespace in list(self._namespaces.items()):
+			yield prefix, namespace
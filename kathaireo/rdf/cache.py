@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Persistent cache for the contents of parsed local RDF resources.
+
+Parsing large RDF/XML files with rdflib can take minutes. Once a file
+has been parsed, its triples and namespace bindings are written to a
+binary snapshot in :data:`directory`. Snapshots are filed under a key
+derived from the file's path, size, modification time and a hash of its
+contents, so that any change to a file results in a cache miss.
+Loading a snapshot is much faster than running the parser again.
+
+The total size of all snapshots is bounded by :data:`max_size`.
+Whenever it is exceeded, the least recently used snapshots are deleted.
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import os
+import time
+import pickle
+import hashlib
+
+from ..util import datadir, log
+
+directory = os.path.join(datadir, 'cache')
+"""Directory where snapshots and the cache index are kept."""
+
+max_size = 2*1024**3
+"""Upper bound for the accumulated size of snapshot files, in bytes."""
+
+last = {}
+"""Outcome of the most recent call of :func:`lookup`. Contains key
+``hit`` (`True` or `False`) and, on hits, ``saved``, the number of
+seconds saved compared to parsing."""
+
+# cache index: {key: {'file':.., 'size':.., 'parsetime':.., 'used':..}}
+_index = None
+
+# read chunks of this size when hashing file contents
+_chunksize = 1024**2
+
+# keys computed so far: {(path, size, mtime): key}
+_keys = {}
+
+
+# compute cache key for local file
+def key(location):
+	"""Returns a key identifying the current state of the file at
+	`location`. It is built from the file's absolute path, its size,
+	its modification time and a SHA-1 hash of its contents.
+	Contents are only hashed again once size or modification time
+	have changed."""
+	path = os.path.abspath(location)
+	stat = os.stat(path)
+	state = (path, stat.st_size, stat.st_mtime)
+	if state in _keys:
+		return _keys.get(state)
+	digest = hashlib.sha1()
+	with open(path, 'rb') as f:
+		chunk = f.read(_chunksize)
+		while chunk:
+			digest.update(chunk)
+			chunk = f.read(_chunksize)
+	fingerprint = u'{}|{}|{}|{}'.format(path, stat.st_size,
+		stat.st_mtime, digest.hexdigest())
+	_keys[state] = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+	return _keys.get(state)
+
+
+# load cache index from disk
+def _get_index():
+	global _index
+	if _index is None:
+		_index = {}
+		try:
+			with open(os.path.join(directory, 'index'), 'rb') as f:
+				_index = pickle.load(f)
+		except Exception:
+			pass
+	return _index
+
+
+# write cache index to disk
+def _save_index():
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	with open(os.path.join(directory, 'index'), 'wb') as f:
+		pickle.dump(_get_index(), f, pickle.HIGHEST_PROTOCOL)
+
+
+# remove least recently used snapshots
+def _evict():
+	index = _get_index()
+	total = sum([e.get('size', 0) for e in index.values()])
+	for k, entry in sorted(index.items(), key=lambda i:i[1].get('used')):
+		if total <= max_size:
+			break
+		try:
+			os.remove(os.path.join(directory, entry.get('file')))
+		except OSError:
+			pass
+		total -= entry.get('size', 0)
+		del index[k]
+		log('Evicted parse cache snapshot {}.'.format(k))
+
+
+# look up parsed contents of local file
+def lookup(location):
+	"""Returns the triples and namespace bindings found in the
+	local file at `location` when it was parsed last time, given that
+	the file has not changed since. If no snapshot is available,
+	`None` is returned.
+	Outcome and time saved are recorded in :data:`last`.
+
+	:returns: tuple ``(triples, namespaces)`` or `None`
+	"""
+	last.clear()
+	last['hit'] = False
+	try:
+		k = key(location)
+	except (IOError, OSError):
+		return None
+	entry = _get_index().get(k)
+	if entry is None:
+		return None
+	start = time.time()
+	try:
+		with open(os.path.join(directory, entry.get('file')), 'rb') as f:
+			triples, bindings = pickle.load(f)
+	except Exception as e:
+		log('Could not read parse cache snapshot {}: {}'.format(k, e))
+		del _get_index()[k]
+		return None
+	entry['used'] = time.time()
+	_save_index()
+	last['hit'] = True
+	last['saved'] = max(0, entry.get('parsetime', 0) - (time.time()-start))
+	return (triples, bindings)
+
+
+# store parsed contents of local file
+def store(location, triples, bindings, parsetime=0):
+	"""Writes a snapshot of the given triples and namespace bindings
+	parsed from the local file at `location` to the cache.
+
+	:param triples: list of triples
+	:param bindings: list of ``(prefix, url)`` tuples
+	:param parsetime: seconds spent parsing the file. Used for telling how
+		much time a later cache hit saves.
+	"""
+	try:
+		k = key(location)
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		filename = '{}.pickle'.format(k)
+		path = os.path.join(directory, filename)
+		with open(path, 'wb') as f:
+			pickle.dump((list(triples), list(bindings)), f,
+				pickle.HIGHEST_PROTOCOL)
+		_get_index()[k] = {'file': filename, 'size': os.path.getsize(path),
+			'parsetime': parsetime, 'used': time.time()}
+		_evict()
+		_save_index()
+	except Exception as e:
+		log('Could not write parse cache snapshot for {}: {}'.format(
+			location, e))
+
+
+# delete all snapshots
+def clear():
+	"""Deletes all snapshots from the cache."""
+	for entry in _get_index().values():
+		try:
+			os.remove(os.path.join(directory, entry.get('file')))
+		except OSError:
+			pass
+	_get_index().clear()
+	_save_index()
@@ -0,0 +1,229 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Compact in-memory store for `rdflib` graphs.
+
+The `rdflib` ``Memory`` store keeps statements in nested dictionaries
+of term objects, three times over, plus one dictionary of contexts per
+statement, which takes well over a kilobyte per statement.
+:class:`CompactStore` keeps every term once, in a dictionary assigning
+it an integer ID, and statements as triples of IDs in three sorted
+permutations: by subject, predicate, object (``SPO``), by predicate,
+object, subject (``POS``) and by object, subject, predicate (``OSP``).
+Each permutation is a column of IDs per position, held in an
+:class:`array.array`, so that a statement takes 36 bytes in all three
+permutations together. Triple patterns are answered by binary search
+within the permutation whose order starts with the terms given.
+
+Statements added are buffered and merged into the permutations in
+sorted batches of up to :data:`buffersize`, or before the next lookup.
+Merging copies the runs of existing statements between the new ones
+as array slices, so that it is cheap even for large graphs.
+
+The store is registered as `rdflib` plugin :data:`plugin`:
+::
+
+	g = rdflib.Graph(store='kathaireo-compact', identifier='g')
+
+It is not context-aware, i.e. it keeps one graph per store instance,
+and terms stay in the dictionary when statements are removed.
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import array
+import bisect
+import operator
+import threading
+
+import rdflib
+from rdflib.store import Store, VALID_STORE
+
+from .bindings import Bindings
+
+plugin = 'kathaireo-compact'
+"""Name the store is registered by as an `rdflib` store plugin."""
+
+buffersize = 100000
+"""Number of statements added which are merged into the permutations
+at once."""
+
+# 4 byte term IDs
+_typecode = 'I' if array.array('I').itemsize >= 4 else 'L'
+
+# statements decoded at once
+_chunksize = 10000
+
+# positions of subject, predicate and object in permutations
+_orders = {'spo': (0, 1, 2), 'pos': (1, 2, 0), 'osp': (2, 0, 1)}
+
+# permutation used for each combination of bound terms
+_plans = {
+	(True, True, True): 'spo', (True, True, False): 'spo',
+	(True, False, False): 'spo', (False, False, False): 'spo',
+	(False, True, True): 'pos', (False, True, False): 'pos',
+	(False, False, True): 'osp', (True, False, True): 'osp'}
+
+
+# sorted permutation of statements
+class _Index(object):
+	"""Statements as three columns of term IDs, sorted by the
+	positions in `order`, e.g. ``(1, 2, 0)`` for ``POS``."""
+	def __init__(self, order):
+		self.order = order
+		self.key = operator.itemgetter(*order)
+		# back from permuted key to subject, predicate, object
+		self.triple = operator.itemgetter(*[order.index(i) for i in range(3)])
+		self.columns = tuple([array.array(_typecode) for i in range(3)])
+
+	def __len__(self):
+		return len(self.columns[0])
+
+	def range(self, values, lo=0):
+		"""Returns the range of rows starting with `values`, a prefix
+		of a key in the order of this permutation. The range is empty
+		if there are none, and starts where they would be inserted."""
+		hi = len(self.columns[0])
+		for column, value in zip(self.columns, values):
+			lo = bisect.bisect_left(column, value, lo, hi)
+			hi = bisect.bisect_right(column, value, lo, hi)
+			if lo >= hi:
+				break
+		return (lo, hi)
+
+	def rows(self, lo, hi):
+		"""Yields the statements in the rows from `lo` to `hi` as
+		``(s, p, o)`` tuples of IDs."""
+		columns = self.columns
+		triple = self.triple
+		for k in range(lo, hi, _chunksize):
+			end = min(k+_chunksize, hi)
+			for key in zip(*[c[k:end] for c in columns]):
+				yield triple(key)
+
+	def splice(self, triples, insert=True):
+		"""Inserts statements given as ``(s, p, o)`` tuples of IDs,
+		or removes them if `insert` is not set. Rows in between are
+		copied over in slices, and the columns are replaced at once."""
+		keys = sorted(set([self.key(t) for t in triples]))
+		if not keys:
+			return
+		old = self.columns
+		new = tuple([array.array(_typecode) for i in range(3)])
+		start = 0
+		for key in keys:
+			lo, hi = self.range(key, lo=start)
+			if (lo < hi) == insert:
+				# already there, or not there to be removed
+				continue
+			for n, o in zip(new, old):
+				n.extend(o[start:lo])
+			if insert:
+				for n, value in zip(new, key):
+					n.append(value)
+				start = lo
+			else:
+				start = hi
+		for n, o in zip(new, old):
+			n.extend(o[start:])
+		self.columns = new
+
+
+# rdflib store
+class CompactStore(Bindings, Store):
+	"""In-memory `rdflib` store keeping statements as sorted arrays of
+	integer term IDs. Neither contexts nor formulae (quoted graphs)
+	are supported."""
+	context_aware = False
+	formula_aware = False
+	transaction_aware = False
+	graph_aware = False
+
+	def __init__(self, configuration=None, identifier=None):
+		self.identifier = identifier
+		self._ids = {}
+		self._terms = []
+		self._pending = set()
+		self._indexes = dict([(name, _Index(order))
+			for name, order in _orders.items()])
+		self._lock = threading.RLock()
+		self._prefixes = {}
+		self._namespaces = {}
+		super(CompactStore, self).__init__(configuration=configuration,
+			identifier=identifier)
+
+	def open(self, configuration, create=True):
+		return VALID_STORE
+
+	def destroy(self, configuration):
+		with self._lock:
+			self._pending.clear()
+			for name, order in _orders.items():
+				self._indexes[name] = _Index(order)
+
+	# id of term, added to dictionary if new
+	def _intern(self, t):
+		i = self._ids.get(t)
+		if i is None:
+			i = len(self._terms)
+			self._ids[t] = i
+			self._terms.append(t)
+		return i
+
+	# merge buffered statements into permutations
+	def _merge(self):
+		with self._lock:
+			if self._pending:
+				pending = list(self._pending)
+				for index in self._indexes.values():
+					index.splice(pending)
+				self._pending.clear()
+
+	def add(self, triple, context, quoted=False):
+		self.addN([triple+(context,)])
+
+	def addN(self, quads):
+		with self._lock:
+			intern = self._intern
+			pending = self._pending
+			for s, p, o, c in quads:
+				pending.add((intern(s), intern(p), intern(o)))
+				if len(pending) >= buffersize:
+					self._merge()
+
+	# ids of statements matching pattern
+	def _match(self, triple):
+		"""Yields the statements matching `triple` as ``(s, p, o)``
+		tuples of IDs, after merging buffered statements."""
+		self._merge()
+		ids = [None if t is None else self._ids.get(t) for t in triple]
+		if any([i is None and t is not None for i, t in zip(ids, triple)]):
+			return iter([])
+		index = self._indexes.get(_plans.get(tuple([i is not None for i in ids])))
+		values = [ids[k] for k in index.order if ids[k] is not None]
+		lo, hi = index.range(values)
+		return index.rows(lo, hi)
+
+	def remove(self, triple, context=None):
+		with self._lock:
+			if triple == (None, None, None):
+				self.destroy(None)
+				return
+			matches = list(self._match(triple))
+			for index in self._indexes.values():
+				index.splice(matches, insert=False)
+
+	def triples(self, triple, context=None):
+		terms = self._terms
+		for s, p, o in self._match(triple):
+			yield (terms[s], terms[p], terms[o]), iter([])
+
+	def __len__(self, context=None):
+		self._merge()
+		return len(self._indexes.get('spo'))
+
+	def contexts(self, triple=None):
+		return iter([])
+
+
+rdflib.plugin.register(plugin, Store, __name__, 'CompactStore')
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Detection of RDF serialization formats.
+
+Rather than having rdflib parse a resource over and over again
+using one format after another until one succeeds, the format
+is determined once in advance from the evidence available: the file
+name extension, the HTTP ``Content-Type`` header for downloads and the
+first few bytes of the resource (XML prolog, ``@prefix`` declarations,
+the shape of N-Triples lines, ...). :func:`detect` weighs this evidence and
+returns the most likely format along with a confidence value, so that
+the parser can be picked exactly once.
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import os
+import re
+
+extensions = {'.rdf': 'xml', '.owl': 'xml', '.xml': 'xml',
+	'.n3': 'n3', '.ttl': 'turtle', '.nt': 'nt', '.nq': 'nquads',
+	'.trig': 'trig', '.jsonld': 'json-ld', '.json': 'json-ld',
+	'.trix': 'trix'}
+"""File name extensions and the rdflib parser formats they indicate."""
+
+contenttypes = {'application/rdf+xml': 'xml', 'text/n3': 'n3',
+	'text/rdf+n3': 'n3', 'text/turtle': 'turtle',
+	'application/x-turtle': 'turtle', 'application/n-triples': 'nt',
+	'application/n-quads': 'nquads', 'application/x-trig': 'trig',
+	'application/trig': 'trig', 'application/ld+json': 'json-ld',
+	'application/trix': 'trix', 'application/xml': 'xml',
+	'text/xml': 'xml'}
+"""Mimetypes and the rdflib parser formats they indicate."""
+
+# weights of evidence sources
+_weights = {'extension': .6, 'contenttype': .7}
+
+# generic mimetypes which are hardly evidence for anything
+_generic = ['application/xml', 'text/xml']
+
+headsize = 4096
+"""Number of bytes read from the beginning of local files."""
+
+# leading bytes signatures
+_xmlex = re.compile(r'\A\s*(<\?xml|<!DOCTYPE|<rdf:RDF|<RDF)', re.I)
+_rdfxmlex = re.compile(r'<(rdf:)?RDF\b|xmlns:rdf=')
+_trixex = re.compile(r'<TriX\b')
+_ttlex = re.compile(r'^\s*(@prefix|@base|PREFIX\s|BASE\s)', re.M)
+_n3ex = re.compile(r'(=>|@forAll|@forSome|\{[^}]*\}\s*=>)')
+_jsonex = re.compile(r'\A\s*[\[{]')
+_trigex = re.compile(r'^\s*(<[^>]*>|\w*:\w*|GRAPH\s+\S+)\s*\{', re.M)
+# n-triples term patterns
+_iri = r'<[^>\s]*>'
+_bnode = r'_:\S+'
+_lit = r'"(?:[^"\\]|\\.)*"(?:@[a-zA-Z-]+|\^\^<[^>\s]*>)?'
+_ntex = re.compile(r'\A\s*({0}|{1})\s+{0}\s+({0}|{1}|{2})\s*\.\s*\Z'.format(
+	_iri, _bnode, _lit))
+_nqex = re.compile(
+	r'\A\s*({0}|{1})\s+{0}\s+({0}|{1}|{2})\s+({0}|{1})\s*\.\s*\Z'.format(
+	_iri, _bnode, _lit))
+
+last = {}
+"""Outcome of the most recent detection: keys ``format`` and
+``confidence``."""
+
+
+# evidence from leading bytes
+def sniff(head):
+	"""Guesses format from the first few bytes of a resource.
+
+	:param head: beginning of resource contents, either `bytes`
+		or a string.
+	:returns: tuple ``(format, confidence)``; ``(None, 0)``
+		if nothing can be told.
+	"""
+	if not head:
+		return (None, 0)
+	if type(head) is bytes:
+		head = head.decode('utf-8', 'replace')
+	if _xmlex.match(head):
+		if _trixex.search(head):
+			return ('trix', .9)
+		if _rdfxmlex.search(head):
+			return ('xml', .95)
+		return ('xml', .7)
+	if _jsonex.match(head):
+		return ('json-ld', .8)
+	if _ttlex.search(head):
+		if _n3ex.search(head):
+			return ('n3', .8)
+		if _trigex.search(head):
+			return ('trig', .7)
+		return ('turtle', .85)
+	# examine shape of the first statement lines. the last line
+	# might be truncated, so leave it out
+	lines = [l for l in head.split('\n')[:-1]
+		if l.strip() and not l.lstrip().startswith('#')][:10]
+	if len(lines) > 0:
+		if all([_ntex.match(l) for l in lines]):
+			return ('nt', .9)
+		if all([_nqex.match(l) or _ntex.match(l) for l in lines]):
+			return ('nquads', .9)
+	return (None, 0)
+
+
+# determine format of resource
+def detect(location=None, contenttype=None, head=None):
+	"""Determines the RDF serialization format of a resource by
+	combining the evidence given by its file name extension, a
+	``Content-Type`` header value and its leading bytes. The format
+	found is recorded in :data:`last`.
+
+	:param location: path or URL of the resource
+	:param contenttype: mimetype as announced by a web server
+	:param head: first few bytes of resource contents
+	:returns: tuple ``(format, confidence)``, where `format` is
+		an rdflib parser identifier and `confidence` a number between
+		0 and 1. If nothing is known, ``(None, 0)`` is returned,
+		which leaves it to rdflib to decide.
+	"""
+	scores = {}
+	# accumulate evidence
+	def vote(fmt, weight):
+		if fmt:
+			scores[fmt] = 1 - (1 - scores.get(fmt, 0)) * (1 - weight)
+	if location:
+		ext = os.path.splitext(location.split('?')[0].split('#')[0])[1]
+		vote(extensions.get(ext.lower()), _weights.get('extension'))
+	if contenttype:
+		mime = contenttype.split(';')[0].strip().lower()
+		weight = _weights.get('contenttype')
+		if mime in _generic:
+			weight /= 2
+		vote(contenttypes.get(mime), weight)
+	vote(*sniff(head))
+	# N3 is a superset of Turtle, and Turtle of N-Triples.
+	# if the more general parser has been suggested, let it
+	# take the evidence for its subsets, too
+	for general, subset in [('n3', 'turtle'), ('turtle', 'nt')]:
+		if general in scores and subset in scores:
+			vote(general, scores.pop(subset))
+	if len(scores) < 1:
+		fmt, confidence = (None, 0)
+	else:
+		fmt, confidence = max(scores.items(), key=lambda i:i[1])
+	last.clear()
+	last.update({'format': fmt, 'confidence': confidence})
+	return (fmt, confidence)
+
+
+# read beginning of local file
+def read_head(location, size=None):
+	"""Returns the first :data:`headsize` bytes of a local file."""
+	with open(location, 'rb') as f:
+		return f.read(size or headsize)
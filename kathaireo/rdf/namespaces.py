@@ -1,7 +1,11 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 import os
+import bisect
+import weakref
+import threading
 import rdflib
+from rdflib.namespace import RDF, RDFS, OWL
 
 from . import remote
 from ..util import log, urlex
@@ -11,41 +15,179 @@ _namespaces={}
 """Directory of instantiated namespaces."""
 _prefixes={}
 """Directory of namespace names, filed under their url."""
+# character trie over the urls in _prefixes. nodes are dicts mapping
+# characters to child nodes; key '' holds the namespace ending there
+_trie={}
+standard={'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+	'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+	'owl': 'http://www.w3.org/2002/07/owl#',
+	'foaf': 'http://xmlns.com/foaf/0.1/',
+	'dc': 'http://purl.org/dc/elements/1.1/'}
+"""Commonly used namespaces, whose vocabularies are downloaded by
+:func:`prefetch` in any case."""
+version=0
+"""Incremented whenever a namespace gets filed under a url, so that
+whatever has been derived from the registry can tell it's outdated."""
+background=True
+"""If set, vocabularies of namespaces newly registered by :func:`reg_graph`
+are fetched in background threads right away."""
 
-# namespace class serving as a rdflib graph container
+# rdf:type values telling that the subject is a property
+_proptypes=set([RDF.Property, OWL.ObjectProperty, OWL.DatatypeProperty,
+	OWL.AnnotationProperty, OWL.OntologyProperty, OWL.FunctionalProperty,
+	OWL.InverseFunctionalProperty, OWL.TransitiveProperty,
+	OWL.SymmetricProperty, OWL.AsymmetricProperty, OWL.ReflexiveProperty,
+	OWL.IrreflexiveProperty, RDFS.ContainerMembershipProperty])
+# rdf:type values telling that the subject is a class
+_classtypes=set([RDFS.Class, OWL.Class, RDFS.Datatype, OWL.Restriction])
+# predicates whose subjects and objects are classes
+_classrels=set([RDFS.subClassOf, OWL.equivalentClass, OWL.disjointWith])
+# predicates whose subjects are properties, and their objects classes
+_proprels=set([RDFS.domain, RDFS.range])
+
+# namespace class keeping an index of vocabulary terms
 class Namespace:
-	"""Dokudoku"""
+	"""Vocabulary located at a namespace URL. Its terms are listed
+	in :attr:`terms`, :attr:`classes` and :attr:`properties`. The
+	vocabulary document is not downloaded before either of those is
+	accessed for the first time, or :meth:`prefetch` starts doing so in
+	a background thread. Once the terms have been indexed, the
+	downloaded graph is dropped.
+
+	Terms are kept in sets, so that adding them takes constant time.
+	Sorted arrays for prefix queries by :meth:`complete` are built from
+	them when needed."""
 	def __init__(self, name, url):
 		self.name = name
 		self.url = u'{}'.format(url)
-		self.classes = []
-		self.properties = []
-		#print 'instantiate namespace {} at {}!'.format(name, url)
-		self.rdf = rdflib.Graph(identifier=name)
-		# try to load namespace source
-		#self.rdf.parse(self.url)
-		#if urlex.match(url):
-			#print "url points to remote resource."
-		# try to retrieve resource
-		try:
-			remote.parse(self.rdf, self.url, guesses=[])
-			# Part of speech stuff
-			for s,p,o in self.rdf:
-				if s.startswith(self.url):
-					if o.endswith("Property"):
-						self.properties.append(str(s))
-					else:
-						self.classes.append(str(s))
-			self.properties = list(set(self.properties))
-			self.classes = [i for i in set(self.classes)
-											if not i in self.properties] # TODO
-		except:
-			pass
-		#_namespaces[name] = self
+		self._terms = set()
+		self._classes = set()
+		self._properties = set()
+		# sorted arrays of terms, classes and properties
+		self._sorted = {}
+		self.size = None
+		"""Number of triples in vocabulary document, once fetched."""
+		self._fetched = False
+		self._thread = None
+		self._lock = threading.Lock()
+		# graphs whose terms are yet to be indexed (see defer)
+		self._sources = []
+
+	@property
+	def terms(self):
+		"""All terms known in this namespace, sorted. Triggers :meth:`fetch`."""
+		return self._get_sorted('terms')
+
+	@property
+	def classes(self):
+		"""Classes defined by this namespace. Triggers :meth:`fetch`."""
+		return self._get_sorted('classes')
+
+	@property
+	def properties(self):
+		"""Properties defined by this namespace. Triggers :meth:`fetch`."""
+		return self._get_sorted('properties')
+
+	# sorted copy of term set, built on demand
+	def _get_sorted(self, kind):
+		self.fetch()
+		self._index_sources()
+		res = self._sorted.get(kind)
+		if res is None:
+			res = sorted(getattr(self, '_'+kind))
+			self._sorted[kind] = res
+		return res
+
+	def complete(self, prefix, kind='terms'):
+		"""Returns the terms of the given `kind` (``'terms'``,
+		``'classes'`` or ``'properties'``) which start with `prefix`, by
+		bisection of a sorted array. Triggers :meth:`fetch`."""
+		terms = self._get_sorted(kind)
+		i = bisect.bisect_left(terms, prefix)
+		j = i
+		while j < len(terms) and terms[j].startswith(prefix):
+			j += 1
+		return terms[i:j]
+
+	def add_term(self, term, kind=None):
+		"""Adds a term found elsewhere (e.g. in a loaded graph) to the
+		index, without causing the vocabulary to be fetched. `kind` is
+		``'class'``, ``'property'`` or `None` if unknown. A term once
+		known to be a property isn't listed as a class.
+
+		:returns: `True` if the index has changed."""
+		if kind == 'property':
+			if term in self._properties:
+				return False
+			self._properties.add(term)
+			self._classes.discard(term)
+		elif kind == 'class':
+			if term in self._classes or term in self._properties:
+				return False
+			self._classes.add(term)
+		elif term in self._terms:
+			return False
+		self._terms.add(term)
+		self._sorted.clear()
+		return True
+
+	def defer(self, g):
+		"""Has the terms of this namespace occuring in graph `g` indexed
+		when terms are looked up next, rather than right away. Statements
+		added to `g` later are indexed as they come in anyway."""
+		self._sources.append(weakref.ref(g))
+
+	# index terms in graphs passed to defer
+	def _index_sources(self):
+		while self._sources:
+			g = self._sources.pop(0)()
+			if g is not None:
+				index(g, split=self.split)
+
+	def split(self, uri):
+		"""Like :func:`split`, but only for this namespace."""
+		if uri.startswith(self.url):
+			term = uri[len(self.url):]
+			if len(term) > 0 and not '/' in term and not '#' in term:
+				return (self, term)
+		return (None, None)
+
+	def prefetch(self):
+		"""Starts fetching the vocabulary in a background thread,
+		unless it has been fetched already."""
+		if not self._fetched and self._thread is None:
+			self._thread = threading.Thread(target=self.fetch,
+				name='namespace {}'.format(self.name))
+			self._thread.daemon = True
+			self._thread.start()
+
+	def fetch(self):
+		"""Downloads the vocabulary document and indexes its terms,
+		unless this has been done before. If a background download
+		started by :meth:`prefetch` is running, waits for it to finish."""
+		if self._fetched:
+			return
+		with self._lock:
+			if self._fetched:
+				return
+			log('Fetch vocabulary of namespace {} at {}.'.format(
+				self.name, self.url))
+			vocab = rdflib.Graph(identifier=self.name)
+			# try to retrieve resource
+			try:
+				remote.parse(vocab, self.url, cached=True)
+				index(vocab, split=self.split)
+			except Exception:
+				pass
+			self.size = len(vocab)
+			self._fetched = True
 
 	def __repr__(self):
+		if self.size is None:
+			return u"<namespace '{}' at {}>: not fetched".format(
+				self.name, self.url)
 		return u"<namespace '{}' at {}>: {} triples".format(
-			self.name, self.url, len(self.rdf))
+			self.name, self.url, self.size)
 
 
 
@@ -71,35 +213,116 @@ def create(name, url):
 	ns = load(name, str(url))
 	if ns:
 		_namespaces[name] = ns
-		_prefixes[str(url).rstrip('/#')] = ns
+		file_url(url, ns)
 		return ns
 	return None
 
 
+# file namespace under url
+def file_url(url, nsp):
+	"""Makes namespace `nsp` known to :func:`get_ns` under `url`.
+	Trailing ``/`` and ``#`` are ignored."""
+	global version
+	url = str(url).rstrip('/#')
+	_prefixes[url] = nsp
+	version += 1
+	node = _trie
+	for c in url:
+		node = node.setdefault(c, {})
+	node[''] = nsp
+
 
 def get_ns(url):
-	"""Looks up ns name for given url."""
-	#print '\n'.join(_prefixes.keys())
-	log('Look up ns for {}.'.format(url))
-	res = None
-	i = 0
-	while res is None and i < 5:
-		res = _prefixes.get(url)
-		if res:
-			#print '\tfound namespace!', '{}..{}'.format(url[:20],url[-10:]), res.name
+	"""Looks up the namespace whose url is the longest prefix of the
+	given url. A namespace url ending on ``/`` or ``#`` only matches
+	up to such a delimiter, so that ``http://ex.org/a/`` is not taken
+	for the namespace of ``http://ex.org/ab``. Takes time
+	proportional to the length of `url`.
+
+	:returns: :class:`Namespace` instance or `None`
+	"""
+	return _lookup(url)[0]
+
+
+# find longest namespace url prefix
+def _lookup(url):
+	res = (None, 0)
+	node = _trie
+	for i, c in enumerate(url):
+		node = node.get(c)
+		if node is None:
 			break
-		if i < 3:
-			url = url[:-1]
-		else:
-			url = url.rsplit('/',1)[0]
-		i += 1
-	if res:
-		log('Found namespace: {}! ({})'.format(res.name, res.url[-10:]))
-	else:
-		log('No namespace found.')
+		nsp = node.get('')
+		if nsp and (i+1 >= len(url) or url[i+1] in '/#' or
+			not nsp.url[-1:] in '/#'):
+			res = (nsp, i+1)
 	return res
 
 
+# split uri into namespace and term
+def split(uri):
+	"""Splits a URI into the namespace it belongs to and the local
+	name of the term within that namespace, as in ``rdfs:label``.
+
+	:returns: tuple ``(namespace, term)``, or ``(None, None)`` if the
+		URI doesn't fall within any known namespace, or if its remainder
+		is not a plain term.
+	"""
+	nsp, length = _lookup(uri)
+	if nsp:
+		term = uri[length:]
+		if term[:1] in ['/', '#']:
+			term = term[1:]
+		if len(term) > 0 and not '/' in term and not '#' in term:
+			return (nsp, term)
+	return (None, None)
+
+
+# assign terms occuring in triples to namespaces
+def index(triples, split=None):
+	"""Adds the URIs occuring in `triples` to the term indices of the
+	namespaces they belong to. Terms are classified as classes or
+	properties by what the triples state about them: predicates and
+	subjects typed as (some kind of) ``rdf:Property`` are properties,
+	``rdf:type`` values and subjects typed as ``rdfs:Class`` are classes,
+	and so are the terms related by ``rdfs:subClassOf`` etc.
+	Only the triples given are examined, so that after loading or adding
+	statements, only those need to be indexed.
+
+	:param triples: iterable of triples or quads (e.g. a graph)
+	:param split: function mapping URIs to ``(namespace, term)``
+		(default: :func:`split`)
+	:returns: number of index entries added
+	"""
+	split = split or globals().get('split')
+	# look up every uri only once
+	seen = {}
+	def add(u, kind=None):
+		if not u in seen:
+			seen[u] = split(u) if isinstance(u, rdflib.URIRef) else (None, None)
+		nsp, term = seen[u]
+		if nsp:
+			return int(nsp.add_term(term, kind=kind))
+		return 0
+	count = 0
+	for t in triples:
+		s, p, o = t[:3]
+		count += add(s) + add(p, 'property') + add(o)
+		if p == RDF.type:
+			count += add(o, 'class')
+			if o in _proptypes:
+				count += add(s, 'property')
+			elif o in _classtypes:
+				count += add(s, 'class')
+		elif p in _classrels:
+			count += add(s, 'class') + add(o, 'class')
+		elif p in _proprels:
+			count += add(s, 'property') + add(o, 'class')
+		elif p == RDFS.subPropertyOf:
+			count += add(s, 'property') + add(o, 'property')
+	return count
+
+
 # register namespaces bound by graph
 def reg_graph(g):
 	"""Copies a graph's collection of namespaces to the
@@ -111,10 +334,15 @@ def reg_graph(g):
 			if not ns in _namespaces}
 		# insert namespace directory into global registry
 		_namespaces.update(rdfns)
+		# download vocabularies without blocking
+		if background:
+			for n in rdfns.values():
+				if n:
+					n.prefetch()
 		# cross file names under urls
-		prfxs = {unicode(url).rstrip('/#'):get(n)
-						for n, url in g.namespaces()}
-		_prefixes.update(prfxs)
+		for n, url in g.namespaces():
+			if get(n):
+				file_url(url, get(n))
 		# copy namespace references to module variable namespace
 		#globals().update(rdfns)
 
@@ -128,8 +356,12 @@ def provide_for(ontology):
 	rdfns = [load(ns, str(ref)) for ns, ref in ontology.namespaces()]
 	# filter
 	ns = [n for n in rdfns if n]
+	for n in ns:
+		n.fetch()
 	ns = {n.name:n for n in ns if not n.name in _namespaces}
 	_namespaces.update(ns)
+	for n in ns.values():
+		file_url(n.url, n)
 	# copy ns pointers to module global variable namespace
 	#globals().update(ns)
 	#print "Namespaces:\n--------------"
@@ -137,6 +369,31 @@ def provide_for(ontology):
 	return ns
 
 
+# warm local cache of vocabulary documents
+def prefetch():
+	"""Downloads the vocabulary documents of all registered namespaces
+	and of those in :data:`standard` into the local document cache of
+	the :mod:`.remote` module, revalidating documents cached before.
+	Namespaces in :data:`standard` get registered if they aren't yet.
+
+	:returns: list of tuples ``(name, url, status, bytes)``, where
+		`status` is `None` if a document could not be obtained.
+	"""
+	urls = {n:nsp.url for n, nsp in _namespaces.items() if nsp}
+	for n, url in standard.items():
+		if not n in urls:
+			create(n, url)
+			urls[n] = url
+	res = []
+	for n, url in sorted(urls.items()):
+		doc = remote.fetch(url, cached=True)
+		if doc:
+			res.append((n, url, doc[2], len(doc[0])))
+		else:
+			res.append((n, url, None, 0))
+	return res
+
+
 # list known namespace names
 def get_names():
 	return sorted(_namespaces.keys())
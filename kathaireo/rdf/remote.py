@@ -7,98 +7,236 @@ from the hard disk of the machine we're running on.
 __docformat__ = "restructuredtext en"
 __version__ = "0.0.1b-dev"
 
+import os
+import time
+import json
+import errno
+import socket
+import hashlib
+import threading
 import urllib.request as urllib2
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+
+from . import formats
+from ..util import datadir, log
 
 mimetypes = ['application/rdf+xml', 'text/n3', 'text/turtle',
 	'application/n-triples','application/x-trig', 'text/owl-functional']
-"""List of mimetypes used for parsing of resources whose rdf format can't
-be detected automatically."""
+"""List of common RDF mimetypes."""
 # oha: http://www.w3.org/TR/owl2-syntax/
 
+cachedir = os.path.join(datadir, 'namespaces')
+"""Directory where documents downloaded by :func:`fetch` are kept."""
+
+timeout = 10
+"""Seconds to wait for a server to respond."""
+
+ttl = 60
+"""Seconds for which the network is considered down after a failed
+request (see :func:`online`)."""
+
+# connectivity status as learned from remote operations
+_status = {'online': None, 'since': 0}
+
+
+# report failure to user, or only to the log if in background
+def _fail(msg):
+	"""Prints `msg`, unless called from a background thread (like
+	those started by :meth:`.namespaces.Namespace.prefetch`), whose
+	output would end up in the middle of the prompt. There, `msg` only
+	goes to the log."""
+	if threading.current_thread() is threading.main_thread():
+		print(msg)
+	else:
+		log(msg)
+
 # attempts to parse rdf resource at a certain location
 # by first downloading and then parsing it offline
-def parse(g, location, format=None, guesses=mimetypes[:3]):
+def parse(g, location, format=None, cached=False):
 	"""\
 	Attempts to parse an RDF resource at a certain location
 	by first downloading and then parsing it offline.
 	Choice of parsing implementation depends on `format`
-	parameter; By default, source format autodetection is
-	applied, followed by a few attempts on forcing
-	specific format parsers to process the source, determined
-	by frequent mimetypes listed in :data:`.mimetypes`.
-
-	Whilst this behaviour will handle RDF sources reliably
-	in most cases, the episode of wild guessing beginning
-	whenever autodetection fails can cause a serious delay.
-	Passing `guesses=None` mitigates this inefficiency,
-	but possibly with the downside of parsing failure at
-	common RDF expression formats.
+	parameter; By default, the source format is determined
+	by :func:`.formats.detect` from the URL, the ``Content-Type``
+	announced by the server and the beginning of the downloaded
+	content. The resource is then parsed exactly once.
 
 	:param g: Graph to write content to
 	:param location: URL of remote RDF source.
 	:param format: string identifying a specific format which
 		the resource is expected to express its RDF contents in.
-		Default is `None`, getting the parser to autodetect
-		the source's format, which goes well in most cases.
-		If autodetection is likely to err, one can pass
+		Default is `None`, causing the format to be detected
+		automatically, which goes well in most cases.
+		If detection is likely to err, one can pass
 		a mimetype like those in :data:`.mimetypes`, but no
 		promise can be made that a correct format parameter
 		will lead to parsing success.
-	:param guesses: List of mimetypes used for wild guessing
-		of the input format in case autodetection fails. Set to
-		`None` in order to trade time for chance.
+	:param cached: if `True`, the document is obtained via the
+		local document cache (see :func:`fetch`).
 	"""
 	#print 'parse remote resource {} into graph {}.'.format(location, g)
+	# download content
+	res = fetch(location, cached=cached)
+	if res is None:
+		return None
+	content, contenttype, status = res
+	if format is None:
+		format, confidence = formats.detect(location,
+			contenttype=contenttype, head=content[:formats.headsize])
+	try:
+		# parse source as specified or detected format
+		g = g.parse(data=content, format=format)
+		return g
+	except Exception as e:
+		# output debug msg
+		_fail('Parsing {} as {} failed: {}'.format(location, format, e))
+		return None
+
+
+# location of cache entry files for url
+def _cachefiles(location):
+	k = hashlib.sha1(location.split('#')[0].encode('utf-8')).hexdigest()
+	return (os.path.join(cachedir, k), os.path.join(cachedir, k+'.json'))
+
+
+# read cached document
+def _cached(location):
+	body, meta = _cachefiles(location)
+	try:
+		with open(meta) as f:
+			info = json.load(f)
+		with open(body, 'rb') as f:
+			return (f.read(), info)
+	except (IOError, OSError, ValueError):
+		return (None, {})
+
+
+# write document to cache
+def _cache(location, content, headers):
+	body, meta = _cachefiles(location)
+	if not os.path.isdir(cachedir):
+		os.makedirs(cachedir)
+	info = {'url': location.split('#')[0],
+		'etag': headers.get('ETag'),
+		'last-modified': headers.get('Last-Modified'),
+		'content-type': headers.get('Content-Type'),
+		'fetched': time.time()}
+	with open(body, 'wb') as f:
+		f.write(content)
+	with open(meta, 'w') as f:
+		json.dump(info, f)
+
+
+# download document
+def fetch(location, cached=False):
+	"""\
+	Downloads the document at `location`.
+
+	With `cached` set, documents are kept in :data:`cachedir`
+	along with their ``ETag`` and ``Last-Modified`` headers. A document
+	found there is revalidated by a conditional request and served
+	from disk if the server answers ``304 Not Modified``, or if it
+	can't be reached at all. This lets namespace vocabularies be
+	available on machines without network access, once they have
+	been fetched (see the `prefetch namespaces` command).
+
+	:returns: tuple ``(content, contenttype, status)``, where `status` is
+		one of ``'downloaded'``, ``'not modified'`` and ``'offline'``; or `None`
+		if the document can't be obtained.
+	"""
+	content, info = (None, {})
+	if cached:
+		content, info = _cached(location)
+	request = urllib2.Request(location)
+	if content is not None:
+		if info.get('etag'):
+			request.add_header('If-None-Match', info.get('etag'))
+		if info.get('last-modified'):
+			request.add_header('If-Modified-Since', info.get('last-modified'))
+	local = _is_local(location)
+	# fail fast while network is known to be down
+	if not (local or online()):
+		if content is not None:
+			return (content, info.get('content-type'), 'offline')
+		_fail('Can\'t get {}: network unreachable!'.format(location))
+		return None
 	# connect to URL
 	try:
-		conne = urllib2.urlopen(location)
+		conne = urllib2.urlopen(request, timeout=timeout)
+		data = conne.read()
+	except HTTPError as e:
+		if not local:
+			report(True)
+		if e.code == 304 and content is not None:
+			return (content, info.get('content-type'), 'not modified')
+		_fail('Can\'t get {}: {}'.format(location, e))
+		return None
 	except Exception as e:
+		if not local and _network_error(e):
+			report(False)
+		if content is not None:
+			log('Serve {} from cache: {}'.format(location, e))
+			return (content, info.get('content-type'), 'offline')
 		if 'Errno -2' in '{}'.format(e):
 			# netz nicht erreichbar
-			print('Can\'t get {}: network unreachable!'.format(location))
+			_fail('Can\'t get {}: network unreachable!'.format(location))
 		else:
-			print('Can\'t get {}.'.format(location))
+			_fail('Can\'t get {}.'.format(location))
 		return None
+	if not local:
+		report(True)
+	if cached:
+		try:
+			_cache(location, data, conne.headers)
+		except (IOError, OSError) as e:
+			log('Could not cache {}: {}'.format(location, e))
+	return (data, conne.headers.get('Content-Type'), 'downloaded')
 
-	# print conne.headers.dict
-	# download content
-	content = conne.read()
-	try:
-		# try to parse source as specified format
-		# or more likely autodetecting format
-		g = g.parse(data=content, format=format)
-		return g
-	except:
-		# if (autodetect) parsing fails,
-		# try again a few times, guessing the right format
-		if len(guesses)>0:
-			if format in guesses:
-				guesses.remove(format)
-			for mime in guesses:
-				try:
-					# try to parse for specified format and return
-					# graph on success
-					g = g.parse(data=content, format=mime)
-					return g
-				except:
-					# output debug msg
-					print('mimetype {} failed.'.format(mime))
-		# if nothing worked at all, return None
-		return None
 
+# connectivity status shared by remote operations
+def online():
+	"""Returns `False` if the network is known to be down, `True` otherwise.
 
-# status internet
-def is_internet_available():
-	"""Tries to establish socket towards google dns server."""
-	try:
-		response = urllib2.socket.gethostbyaddr('8.8.8.8')
-		if 'google.com' in response[0]:
-			return True
-		print(response)
-		return False
-	except:
-		return False
+	The status is not probed, but learned from the outcome of remote
+	operations (see :func:`report`) and trusted for :data:`ttl` seconds.
+	While the network is known to be down, :func:`fetch` fails right away
+	instead of having every request wait for a timeout. Once the status
+	has expired, the next request is let through to find out whether the
+	network is back.
+	"""
+	if _status.get('online') is False:
+		if time.time() - _status.get('since') < ttl:
+			return False
+		_status['online'] = None
+	return True
+
+
+# update connectivity status
+def report(success):
+	"""Records the outcome of a remote operation for :func:`online`.
+	`success` is `False` if the network could not be reached."""
+	if success != _status.get('online'):
+		log('Network status: {}.'.format(['offline', 'online'][int(success)]))
+	_status['online'] = success
+	_status['since'] = time.time()
+
+
+# tell network failures from failures of single hosts
+def _network_error(e):
+	reason = getattr(e, 'reason', e)
+	if isinstance(reason, socket.timeout):
+		return True
+	# names which don't exist don't tell anything about the network
+	if isinstance(reason, socket.gaierror):
+		return reason.errno == socket.EAI_AGAIN
+	return getattr(reason, 'errno', None) in [errno.ENETUNREACH,
+		errno.EHOSTUNREACH, errno.ENETDOWN]
 
 
-# try to determine if internet connection is available
-web_access=is_internet_available()
+# local locations are reachable without network
+def _is_local(location):
+	host = urlparse(location).hostname or ''
+	return location.startswith('file:') or host in ['localhost', '::1'] or \
+		host.startswith('127.')
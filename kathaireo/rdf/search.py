@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Inverted index for looking up the triples of a graph in which a
+certain URI occurs.
+
+Instead of rendering every triple of a graph to text and matching it
+against a regular expression, `find` asks an index which is built
+once per graph by a single pass over its triples. It keeps the
+distinct URIs of the graph and the local names they end on (as in
+``foaf:knows``) in sorted arrays, and files the positions of the
+triples they occur in under each URI. Exact and prefix lookups are
+answered by bisection.
+
+The index of a graph is built when first needed and dropped by
+:func:`touch` whenever the graph is changed by a command.
+
+Besides, the distinct namespace-like prefixes of the URIs in a graph
+are kept in a :class:`Prefixes` set, for completion of namespace URLs.
+As it is small, it is not dropped but updated with the statements
+added to the graph (see :func:`add`).
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import bisect
+import weakref
+import rdflib
+
+# indices by graph: {id(g): (weakref to g, index)}
+_indices = {}
+
+# uri prefix sets by graph: {id(g): (weakref to g, prefixes)}
+_prefixes = {}
+
+
+# inverted index of a single graph
+class Index(object):
+	"""Inverted index of the URIs occuring in a graph."""
+	def __init__(self, g):
+		self.triples = []
+		"""Triples of the graph, in the order indexed."""
+		self.postings = {}
+		"""Positions in :attr:`triples` filed under URIs."""
+		for i, t in enumerate(g):
+			self.triples.append(t)
+			for u in t:
+				if isinstance(u, rdflib.URIRef):
+					self.postings.setdefault(u, []).append(i)
+		self.uris = sorted(self.postings.keys())
+		"""Sorted array of distinct URIs."""
+		self.names = sorted([(local_name(u), u) for u in self.uris])
+		"""Sorted array of ``(local name, URI)`` tuples."""
+		self.size = len(self.triples)
+
+	def uris_starting(self, prefix):
+		"""Returns the URIs beginning with `prefix`."""
+		i = bisect.bisect_left(self.uris, prefix)
+		res = []
+		while i < len(self.uris) and self.uris[i].startswith(prefix):
+			res.append(self.uris[i])
+			i += 1
+		return res
+
+	def uris_named(self, prefix):
+		"""Returns the URIs whose local name begins with `prefix`."""
+		i = bisect.bisect_left(self.names, (prefix,))
+		res = []
+		while i < len(self.names) and self.names[i][0].startswith(prefix):
+			res.append(self.names[i][1])
+			i += 1
+		return res
+
+	def lookup(self, uris):
+		"""Returns the triples containing any of the given URIs,
+		in the order they have been indexed."""
+		positions = set()
+		for u in uris:
+			positions.update(self.postings.get(u, []))
+		return [self.triples[i] for i in sorted(positions)]
+
+
+# namespace-like uri prefixes in a graph
+class Prefixes(object):
+	"""Set of the namespace-like prefixes of URIs, i.e. everything
+	up to the last ``#`` or ``/``. Prefix queries are answered by
+	bisection of a sorted array, which is rebuilt only after
+	new prefixes have been added."""
+	def __init__(self, triples=[]):
+		self.urls = set()
+		self._sorted = []
+		self.add(triples)
+
+	def add(self, triples):
+		"""Adds the prefixes of the URIs in `triples`."""
+		size = len(self.urls)
+		for t in triples:
+			for u in t[:3]:
+				if isinstance(u, rdflib.URIRef):
+					url = namespace_url(u)
+					if url:
+						self.urls.add(url)
+		if len(self.urls) != size:
+			self._sorted = None
+
+	def starting(self, prefix):
+		"""Returns the URI prefixes beginning with `prefix`."""
+		if self._sorted is None:
+			self._sorted = sorted(self.urls)
+		i = bisect.bisect_left(self._sorted, prefix)
+		res = []
+		while i < len(self._sorted) and self._sorted[i].startswith(prefix):
+			res.append(self._sorted[i])
+			i += 1
+		return res
+
+
+# namespace part of uri
+def namespace_url(u):
+	"""Returns a URI up to and including its last ``#`` or ``/``,
+	or `None` if there is no such part besides the scheme."""
+	i = max(u.rfind('#'), u.rfind('/'))
+	if i > u.find('://')+2:
+		return u[:i+1]
+	return None
+
+
+# local part of uri
+def local_name(u):
+	"""Returns what follows the last ``#`` or ``/`` in a URI."""
+	for delim in '#/':
+		if delim in u:
+			return u.rsplit(delim, 1)[1]
+	return u
+
+
+# obtain index of graph
+def get_index(g):
+	"""Returns the :class:`Index` of graph `g`, building it first if
+	there is none, or if the graph has evidently changed in size
+	without :func:`touch` having been called."""
+	entry = _indices.get(id(g))
+	if entry is not None and entry[0]() is g:
+		index = entry[1]
+		if index.size == len(g):
+			return index
+	index = Index(g)
+	_indices[id(g)] = (weakref.ref(g), index)
+	return index
+
+
+# invalidate index after modification
+def touch(g):
+	"""Drops the index of graph `g`. To be called whenever statements
+	are added to or removed from `g`."""
+	if g is not None:
+		_indices.pop(id(g), None)
+
+
+# find triples containing uris
+def find(g, term='', url=None):
+	"""Looks up the triples of graph `g` containing URIs whose local
+	name begins with `term`, or, if a namespace `url` is given, URIs
+	beginning with `url` followed by `term`.
+
+	:returns: tuple ``(triples, uris)``, where `uris` is the set of
+		URIs found to match.
+	"""
+	index = get_index(g)
+	if url is None:
+		uris = index.uris_named(term)
+	else:
+		uris = index.uris_starting(url+term)
+		if not url[-1:] in ['/', '#']:
+			for delim in '#/':
+				uris.extend(index.uris_starting(url+delim+term))
+	uris = set(uris)
+	return (index.lookup(uris), uris)
+
+
+# obtain uri prefix set of graph
+def prefixes(g):
+	"""Returns the :class:`Prefixes` of graph `g`, collecting them
+	from all of its triples if this hasn't been done before."""
+	entry = _prefixes.get(id(g))
+	if entry is not None and entry[0]() is g:
+		return entry[1]
+	res = Prefixes(g)
+	_prefixes[id(g)] = (weakref.ref(g), res)
+	return res
+
+
+# update after statements have been added
+def add(g, triples):
+	"""Adds the URI prefixes in `triples` to the :class:`Prefixes`
+	of graph `g`, if those have been collected before, and drops
+	the graph's :class:`Index`."""
+	touch(g)
+	entry = _prefixes.get(id(g))
+	if entry is not None and entry[0]() is g:
+		entry[1].add(triples)
@@ -0,0 +1,518 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""\
+Dictionary-encoded SQLite store for `rdflib` graphs.
+
+`rdflib_sqlalchemy` writes the full text of every URI and literal into
+every statement row, so that databases get large and lookups compare
+long strings. :class:`SQLiteStore` keeps every term once, in table
+``terms``, and statements as rows of four integer term IDs in table
+``quads``. Its primary key and two indexes order statements by
+context, then by subject, predicate, object (``CSPO``), by predicate,
+object, subject (``CPOS``) or by object, subject, predicate (``COSP``).
+Every index contains all four columns, so any triple pattern within a
+graph is answered from one index alone. Patterns matched across all
+graphs of a database (with no context given) can't make use of them
+and are answered by scanning table ``quads``.
+
+The store is registered as `rdflib` plugin :data:`plugin`, so that
+::
+
+	g = rdflib.Graph(store='kathaireo-sqlite', identifier='g')
+
+creates a graph in a private in-memory database, and
+::
+
+	g = rdflib.Graph(store='kathaireo-sqlite', identifier='g')
+	g.open('sqlite:///path/to/file.sqlite', create=True)
+
+one kept in a file (see also :func:`.rdf.store_sqlite`).
+
+SQL statements are only ever built from a fixed set of strings, so
+the statement cache of `sqlite3` has them compiled just once per
+connection. Connections are taken from a small pool, and terms and
+their IDs are cached in memory.
+"""
+__docformat__ = "restructuredtext en"
+__version__ = "0.0.1-dev"
+
+import os
+import sqlite3
+import threading
+import itertools
+import contextlib
+
+import rdflib
+from rdflib.store import Store, VALID_STORE
+from rdflib.term import URIRef, BNode, Literal
+
+from .bindings import Bindings
+from ..util import log
+
+plugin = 'kathaireo-sqlite'
+"""Name the store is registered by as an `rdflib` store plugin."""
+
+poolsize = 4
+"""Maximum number of idle connections kept by a store."""
+
+cachesize = 500000
+"""Maximum number of terms whose IDs are kept in memory per store."""
+
+# term kinds
+_URI, _BNODE, _LITERAL = (0, 1, 2)
+
+# columns of table quads
+_columns = ['s', 'p', 'o', 'c']
+
+_schema = [
+	'''CREATE TABLE IF NOT EXISTS terms (id INTEGER PRIMARY KEY,
+		kind INTEGER NOT NULL, value TEXT NOT NULL, extra TEXT NOT NULL,
+		UNIQUE (kind, value, extra))''',
+	'''CREATE TABLE IF NOT EXISTS quads (s INTEGER NOT NULL,
+		p INTEGER NOT NULL, o INTEGER NOT NULL, c INTEGER NOT NULL,
+		PRIMARY KEY (c, s, p, o)) WITHOUT ROWID''',
+	'''CREATE TABLE IF NOT EXISTS namespaces (prefix TEXT PRIMARY KEY,
+		uri TEXT NOT NULL)''']
+
+# secondary indexes, dropped during bulk loads
+_indexes = [
+	'CREATE INDEX IF NOT EXISTS quads_pos ON quads (c, p, o, s)',
+	'CREATE INDEX IF NOT EXISTS quads_osp ON quads (c, o, s, p)']
+
+# select statements by combination of bound columns
+_selects = {}
+
+# memory databases are told apart by number
+_memory = itertools.count()
+
+# rows fetched by the first query of a lookup, doubling with every
+# further one, up to _maxpage
+_pagesize = 1000
+_maxpage = 100000
+
+
+# encode term as row of table terms
+def _encode(t):
+	if isinstance(t, Literal):
+		if t.language:
+			return (_LITERAL, str(t), '@'+t.language)
+		return (_LITERAL, str(t), str(t.datatype or ''))
+	if isinstance(t, BNode):
+		return (_BNODE, str(t), '')
+	if isinstance(t, URIRef):
+		return (_URI, str(t), '')
+	raise TypeError('Can\'t store {} {}.'.format(type(t).__name__, t))
+
+
+# decode row of table terms
+def _decode(kind, value, extra):
+	if kind == _URI:
+		return URIRef(value)
+	if kind == _BNODE:
+		return BNode(value)
+	if extra.startswith('@'):
+		return Literal(value, lang=extra[1:])
+	return Literal(value, datatype=extra or None)
+
+
+# select statement for pattern
+def _select(bound, distinct=False, after=False):
+	"""Returns the SQL statement selecting a page of statements with the
+	columns in `bound` given, e.g. ``('c', 'p')``. Statements come in the
+	order of :func:`_order`, and, if `after` is set, start behind a
+	statement given by the values of its other columns in that order.
+	The last parameter is the maximum number of rows."""
+	key = (bound, distinct, after)
+	if not key in _selects:
+		where = ['{}=?'.format(c) for c in bound]
+		order = ', '.join(_order(bound))
+		if after and order:
+			where.append('({}) > ({})'.format(order,
+				', '.join(['?']*len(_order(bound)))))
+		_selects[key] = 'SELECT {}s, p, o FROM quads WHERE {}{} LIMIT ?'.format(
+			['', 'DISTINCT '][int(distinct)], ' AND '.join(where) or '1',
+			' ORDER BY {}'.format(order) if order else '')
+	return _selects.get(key)
+
+
+# columns by which to order statements matching pattern
+def _order(bound):
+	"""Returns those of the columns `s`, `p` and `o` not in `bound`, in
+	the order of the index that serves a pattern with `bound` given."""
+	if 'p' in bound and not 's' in bound:
+		order = ('p', 'o', 's')
+	elif 'o' in bound and not 'p' in bound:
+		order = ('o', 's', 'p')
+	else:
+		order = ('s', 'p', 'o')
+	return tuple([c for c in order if not c in bound])
+
+
+# connection pool
+class _Pool(object):
+	"""Keeps up to :data:`poolsize` idle connections made by `connect`.
+	If `shared` is set, only a single connection is made and handed out
+	to one thread at a time, which is what in-memory databases need."""
+	def __init__(self, connect, shared=False):
+		self.connect = connect
+		self.shared = connect() if shared else None
+		self.idle = []
+		self.lock = threading.RLock()
+
+	@contextlib.contextmanager
+	def connection(self):
+		"""Context providing a connection."""
+		if self.shared is not None:
+			with self.lock:
+				yield self.shared
+			return
+		with self.lock:
+			conn = self.idle.pop() if self.idle else None
+		if conn is None:
+			conn = self.connect()
+		try:
+			yield conn
+		finally:
+			with self.lock:
+				if len(self.idle) < poolsize:
+					self.idle.append(conn)
+					conn = None
+			if conn is not None:
+				conn.close()
+
+	def close(self):
+		"""Closes all connections."""
+		with self.lock:
+			for conn in self.idle + [c for c in [self.shared] if c]:
+				conn.close()
+			self.idle = []
+			self.shared = None
+
+
+# rdflib store
+class SQLiteStore(Bindings, Store):
+	"""Context-aware `rdflib` store keeping statements as integer IDs
+	of the terms they consist of. Formulae (quoted graphs) are not
+	supported."""
+	context_aware = True
+	formula_aware = False
+	transaction_aware = False
+	graph_aware = False
+
+	def __init__(self, configuration=None, identifier=None):
+		self.database = None
+		"""Location of the database as passed to ``sqlite3.connect``."""
+		self.pragmas = {}
+		"""Pragmas set on every connection (see :func:`.storage.tune`)."""
+		self.settings = {}
+		"""Pragmas kept by the database file, set once when opening or
+		tuning the store."""
+		self.profile = None
+		"""Name of the tuning profile applied."""
+		self._pool = None
+		self._ids = {}
+		self._terms = {}
+		self._prefixes = {}
+		self._namespaces = {}
+		super(SQLiteStore, self).__init__(configuration=configuration,
+			identifier=identifier)
+
+	# file name from configuration
+	def _path(self, configuration):
+		if configuration.startswith('sqlite:///'):
+			return configuration[len('sqlite:///'):]
+		return configuration
+
+	def open(self, configuration, create=True):
+		"""Opens the database at `configuration`, a file name or an
+		``sqlite:///`` URL, creating tables and indexes if they don't
+		exist. Without a configuration, a new in-memory database is
+		opened."""
+		self.close()
+		memory = not configuration or configuration in [':memory:', 'sqlite://']
+		if memory:
+			self.database = 'file:kathaireo-{}-{}?mode=memory'.format(
+				os.getpid(), next(_memory))
+		else:
+			self.database = self._path(configuration)
+			if not create and not os.path.exists(self.database):
+				raise RuntimeError('No database at {}.'.format(self.database))
+		self._pool = _Pool(self._connect, shared=memory)
+		with self._connection() as conn:
+			self._settle(conn)
+			with conn:
+				for statement in _schema+_indexes:
+					conn.execute(statement)
+			self._namespaces = dict([(p, URIRef(u)) for p, u in
+				conn.execute('SELECT prefix, uri FROM namespaces')])
+		self._prefixes = dict([(u, p) for p, u in self._namespaces.items()])
+		return VALID_STORE
+
+	# make new connection
+	def _connect(self):
+		conn = sqlite3.connect(self.database, uri=self.database.startswith('file:'),
+			check_same_thread=False, cached_statements=256)
+		for key, value in self.pragmas.items():
+			conn.execute('PRAGMA {}={}'.format(key, value))
+		return conn
+
+	# obtain connection, opening in-memory database if necessary
+	def _connection(self):
+		if self._pool is None:
+			self.open(None)
+		return self._pool.connection()
+
+	def close(self, commit_pending_transaction=False):
+		if self._pool is not None:
+			self._pool.close()
+			self._pool = None
+		self._ids.clear()
+		self._terms.clear()
+
+	def destroy(self, configuration):
+		self.close()
+		path = self._path(configuration)
+		if os.path.exists(path):
+			os.remove(path)
+
+	def tune(self, pragmas, profile=None, settings=None):
+		"""Sets `pragmas` on every connection made from now on, and
+		`settings`, pragmas persisting in the database file such as
+		``journal_mode``, once."""
+		self.pragmas = dict(pragmas)
+		self.settings = dict(settings or {})
+		self.profile = profile
+		if self._pool is None:
+			return
+		if self._pool.shared is None:
+			# drop idle connections
+			self._pool.close()
+		with self._connection() as conn:
+			if self._pool.shared is not None:
+				for key, value in self.pragmas.items():
+					conn.execute('PRAGMA {}={}'.format(key, value))
+			self._settle(conn)
+
+	# apply settings persisting in database file
+	def _settle(self, conn):
+		for key, value in self.settings.items():
+			try:
+				conn.execute('PRAGMA {}={}'.format(key, value))
+			except sqlite3.OperationalError as e:
+				# other connections to the database prevent the change
+				log('Could not set {} of {} to {}: {}'.format(key, self.database,
+					value, e))
+
+	# ids of terms, optionally creating them
+	def _lookup(self, conn, terms, create=False):
+		"""Returns the IDs of `terms` by term. Terms not in the dictionary
+		are added if `create` is set, and left out otherwise."""
+		res = {}
+		missing = []
+		for t in terms:
+			i = self._ids.get(t)
+			if i is None:
+				missing.append(t)
+			else:
+				res[t] = i
+		if not missing:
+			return res
+		if len(self._ids) + len(missing) > cachesize:
+			self._ids.clear()
+		rows = [_encode(t) for t in missing]
+		if create:
+			conn.executemany('INSERT OR IGNORE INTO terms (kind, value, extra) VALUES (?, ?, ?)', rows)
+		for t, row in zip(missing, rows):
+			found = conn.execute('SELECT id FROM terms WHERE kind=? AND value=? AND extra=?',
+				row).fetchone()
+			if found:
+				res[t] = found[0]
+				self._ids[t] = found[0]
+		return res
+
+	# terms by ids
+	def _resolve(self, conn, ids):
+		"""Makes sure the terms identified by `ids` are in the cache."""
+		missing = list(set([i for i in ids if not i in self._terms]))
+		if not missing:
+			return
+		if len(self._terms) + len(missing) > cachesize:
+			self._terms.clear()
+			missing = list(set(ids))
+		for k in range(0, len(missing), 500):
+			chunk = missing[k:k+500]
+			for i, kind, value, extra in conn.execute(
+				'SELECT id, kind, value, extra FROM terms WHERE id IN ({})'.format(
+				','.join(['?']*len(chunk))), chunk):
+				self._terms[i] = _decode(kind, value, extra)
+
+	# context identifier
+	def _context(self, context):
+		if context is None:
+			return None
+		return getattr(context, 'identifier', context)
+
+	# discard cached ids after failed writes
+	def _forget(self):
+		self._ids.clear()
+		self._terms.clear()
+
+	def add(self, triple, context, quoted=False):
+		self.addN([triple+(context,)])
+
+	def addN(self, quads):
+		with self.transaction() as conn:
+			self.insert(conn, quads)
+
+	@contextlib.contextmanager
+	def transaction(self):
+		"""Context providing a connection whose changes are committed
+		at the end, or rolled back if an exception occurs."""
+		with self._connection() as conn:
+			try:
+				with conn:
+					yield conn
+			except Exception:
+				self._forget()
+				raise
+
+	def insert(self, conn, quads):
+		"""Inserts `quads` using connection `conn`, within the
+		transaction in progress (see :meth:`transaction`)."""
+		quads = [(s, p, o, self._context(c)) for s, p, o, c in quads]
+		if not quads:
+			return
+		ids = self._lookup(conn, set([t for q in quads for t in q]), create=True)
+		conn.executemany('INSERT OR IGNORE INTO quads (s, p, o, c) VALUES (?, ?, ?, ?)',
+			[tuple([ids[t] for t in q]) for q in quads])
+
+	# bound columns and their values for pattern
+	def _pattern(self, conn, triple, context):
+		"""Returns bound columns and their IDs, or `None` if any of
+		the terms given is unknown."""
+		terms = list(triple) + [self._context(context)]
+		given = [t for t in terms if t is not None]
+		ids = self._lookup(conn, given)
+		if len(ids) < len(set(given)):
+			return None
+		bound = tuple([c for c, t in zip(_columns, terms) if t is not None])
+		return (bound, [ids[t] for t in terms if t is not None])
+
+	def remove(self, triple, context=None):
+		with self._connection() as conn:
+			pattern = self._pattern(conn, triple, context)
+			if pattern is None:
+				return
+			bound, values = pattern
+			where = ' AND '.join(['{}=?'.format(c) for c in bound]) or '1'
+			with conn:
+				conn.execute('DELETE FROM quads WHERE {}'.format(where), values)
+
+	def triples(self, triple, context=None):
+		# statements are fetched page by page, so that no connection is
+		# held (and no database locked) while the caller takes its time
+		with self._connection() as conn:
+			pattern = self._pattern(conn, triple, context)
+		if pattern is None:
+			return
+		bound, values = pattern
+		union = self._context(context) is None
+		keys = [_columns.index(c) for c in _order(bound)]
+		size = _pagesize
+		last = None
+		while True:
+			with self._connection() as conn:
+				if last is None:
+					rows = conn.execute(_select(bound, distinct=union),
+						values+[size]).fetchall()
+				else:
+					rows = conn.execute(_select(bound, distinct=union, after=True),
+						values+last+[size]).fetchall()
+				self._resolve(conn, set([i for r in rows for i in r]))
+				page = [tuple([self._terms.get(i) for i in r]) for r in rows]
+			for t in page:
+				if union:
+					yield t, self._contexts_of(t)
+				else:
+					yield t, iter([context])
+			if len(rows) < size:
+				return
+			last = [rows[-1][k] for k in keys]
+			size = min(size*2, _maxpage)
+
+	def __len__(self, context=None):
+		with self._connection() as conn:
+			if self._context(context) is None:
+				return conn.execute(
+					'SELECT COUNT(*) FROM (SELECT DISTINCT s, p, o FROM quads)').fetchone()[0]
+			ids = self._lookup(conn, [self._context(context)])
+			if not ids:
+				return 0
+			return conn.execute('SELECT COUNT(*) FROM quads WHERE c=?',
+				list(ids.values())).fetchone()[0]
+
+	# contexts of triple, looked up when asked for
+	def _contexts_of(self, triple):
+		for c in self.contexts(triple):
+			yield c
+
+	def contexts(self, triple=None):
+		with self._connection() as conn:
+			if triple is None or triple == (None, None, None):
+				ids = [r[0] for r in conn.execute('SELECT DISTINCT c FROM quads')]
+			else:
+				pattern = self._pattern(conn, triple, None)
+				if pattern is None:
+					return iter([])
+				bound, values = pattern
+				ids = [r[0] for r in conn.execute(
+					'SELECT DISTINCT c FROM quads WHERE {}'.format(
+					' AND '.join(['{}=?'.format(c) for c in bound])), values)]
+			self._resolve(conn, ids)
+		return iter([self._terms.get(i) for i in ids])
+
+	def bind(self, prefix, namespace, override=True):
+		# connect first: opening the store reloads its bindings
+		with self._connection() as conn:
+			super(SQLiteStore, self).bind(prefix, namespace, override=override)
+			with conn:
+				conn.execute('DELETE FROM namespaces')
+				conn.executemany('INSERT INTO namespaces (prefix, uri) VALUES (?, ?)',
+					[(p, str(u)) for p, u in self._namespaces.items()])
+
+	def copy_context(self, source, target):
+		"""Copies all statements of context `source` to context `target`
+		within the database. Both are graph identifiers.
+
+		:returns: number of statements copied
+		"""
+		with self._connection() as conn:
+			try:
+				with conn:
+					ids = self._lookup(conn, [source, target], create=True)
+					cursor = conn.execute('''INSERT OR IGNORE INTO quads (s, p, o, c)
+						SELECT s, p, o, ? FROM quads WHERE c=?''', (ids[target],
+						ids[source]))
+					return cursor.rowcount
+			except Exception:
+				self._forget()
+				raise
+
+	def drop_indexes(self):
+		"""Drops the ``CPOS`` and ``COSP`` indexes."""
+		with self._connection() as conn:
+			with conn:
+				for index in ['quads_pos', 'quads_osp']:
+					conn.execute('DROP INDEX IF EXISTS {}'.format(index))
+
+	def create_indexes(self):
+		"""Creates missing indexes and has SQLite collect statistics
+		for its query planner by running ``ANALYZE``."""
+		with self._connection() as conn:
+			with conn:
+				for statement in _indexes:
+					conn.execute(statement)
+			conn.execute('ANALYZE')
+
+
+rdflib.plugin.register(plugin, Store, __name__, 'SQLiteStore')
@@ -1,20 +1,183 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*- 
+import os
+import time
+import codecs
+import weakref
+import contextlib
 import rdflib
+import sqlalchemy
 import rdflib_sqlalchemy
 from rdflib_sqlalchemy.SQLAlchemy import SQLAlchemy
+from rdflib.plugins.parsers import ntriples
+
+from .sqlstore import SQLiteStore
+from ..util import log
+
+batchsize = 10000
+"""Default number of triples inserted per transaction by :func:`stream_import`
+and :func:`copy`."""
+
+profiles = {
+	'safe': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+	'fast': {'journal_mode': 'WAL', 'synchronous': 'NORMAL',
+		'cache_size': -64*1024, 'mmap_size': 256*1024**2, 'temp_store': 'MEMORY'},
+	'bulk': {'journal_mode': 'WAL', 'synchronous': 'OFF',
+		'cache_size': -512*1024, 'mmap_size': 1024**3, 'temp_store': 'MEMORY'}}
+"""SQLite pragmas by tuning profile (see :func:`tune`). ``safe`` is what
+SQLite does by default: a rollback journal, synced on every commit.
+``fast`` keeps a write-ahead log, which is synced at checkpoints only,
+and has reads served from a 64 MB page cache and memory-mapped I/O.
+``bulk`` is applied during bulk loads (see :func:`bulk`)
+and doesn't sync at all. Negative ``cache_size`` values are in KB.
+``journal_mode`` persists in the database file, and is only set when
+a profile is applied, not on every connection."""
+
+profile = 'fast'
+"""Profile applied to sqlite stores unless specified otherwise."""
+
+bulksize = 100000
+"""Number of statements from which on they are inserted into sqlite
+stores in bulk load mode (see :func:`bulk`)."""
+
+# tables of rdflib_sqlalchemy stores holding statements
+_sqltables = ['asserted_statements', 'type_statements', 'literal_statements',
+	'quoted_statements']
+
+# pragmas in effect by engine: {engine: [profile, pragmas]}
+_tuning = weakref.WeakKeyDictionary()
+
+# pragmas kept by the database file rather than the connection
+_persistent = ['journal_mode']
 
 
 # create sqlite databse store
-def sqlite(filename):
+def sqlite(filename, native=False):
 	"""Assigns an sqlite databse resource for an rdf graph 
 	as a persistent store.
-	Will overwrite? existing graph."""
+	Will overwrite? existing graph.
+	If `native` is set, the store is a dictionary-encoded
+	:class:`.sqlstore.SQLiteStore` instead of an `rdflib_sqlalchemy` one."""
 	# TODO: test filename validity
-	store = SQLAlchemy(configuration="sqlite:///{}".format(filename))
+	# database is connected to when graph gets opened
+	store = [SQLAlchemy, SQLiteStore][int(bool(native))]()
+	store.configuration = "sqlite:///{}".format(filename)
 	return store
 
 
+# set pragmas on connections to sqlite store
+def tune(store, name=None):
+	"""Has the pragmas of the given profile (see :data:`profiles`,
+	default: :data:`profile`) set on every connection the engine of an
+	opened sqlite `store` makes from now on. As `rdflib_sqlalchemy`
+	connects for every operation, this includes all further operations.
+
+	:returns: name of the profile applied, or `None` if `store` is no
+		sqlite store
+	"""
+	name = name or profile
+	pragmas, settings = _split(profiles.get(name))
+	if isinstance(store, SQLiteStore):
+		store.tune(pragmas, profile=name, settings=settings)
+		return name
+	engine = getattr(store, 'engine', None)
+	if engine is None or engine.name != 'sqlite':
+		return None
+	if not engine in _tuning:
+		_tuning[engine] = [name, {}]
+		sqlalchemy.event.listen(engine, 'connect',
+			_pragma_setter(_tuning[engine][1]))
+	_tuning[engine][0] = name
+	_tuning[engine][1].clear()
+	_tuning[engine][1].update(pragmas)
+	# drop pooled connections, and switch journal mode, which persists
+	engine.dispose()
+	with engine.connect() as connection:
+		for key, value in settings.items():
+			try:
+				connection.exec_driver_sql('PRAGMA {}={}'.format(key, value))
+			except sqlalchemy.exc.OperationalError as e:
+				# other connections to the database prevent the change
+				log('Could not set {} of {} to {}: {}'.format(key,
+					store.configuration, value, e))
+	return name
+
+
+# separate pragmas persisting in database file
+def _split(pragmas):
+	"""Returns the pragmas to be set per connection and those
+	persisting in the database file (see :data:`_persistent`)."""
+	return (dict([(k, v) for k, v in pragmas.items() if not k in _persistent]),
+		dict([(k, v) for k, v in pragmas.items() if k in _persistent]))
+
+
+# listener setting pragmas on new sqlite connections
+def _pragma_setter(pragmas):
+	def connect(dbapi_connection, record):
+		cursor = dbapi_connection.cursor()
+		for key, value in pragmas.items():
+			cursor.execute('PRAGMA {}={}'.format(key, value))
+		cursor.close()
+	return connect
+
+
+# tuning profile of store
+def tuning(store):
+	"""Returns the name of the profile applied to `store` by :func:`tune`,
+	or `None`."""
+	if isinstance(store, SQLiteStore):
+		return store.profile
+	engine = getattr(store, 'engine', None)
+	if engine is None or not engine in _tuning:
+		return None
+	return _tuning[engine][0]
+
+
+# bulk load mode for sqlite stores
+@contextlib.contextmanager
+def bulk(g, size):
+	"""Context for inserting `size` statements into graph `g`. If `g` is
+	kept in an sqlite database and `size` reaches :data:`bulksize`, the
+	``bulk`` profile is applied and the secondary indexes of the statement
+	tables are dropped, which makes inserting several times faster.
+	When done, indexes are rebuilt, which is faster than having
+	them updated with every statement, ``ANALYZE`` has SQLite collect
+	statistics for its query planner, and the profile applied before is
+	restored. Unique indexes are kept, as they keep out duplicates.
+	A :class:`.sqlstore.SQLiteStore` keeps its ``CSPO`` index, the
+	primary key of its statements.
+	"""
+	store = g.store
+	if size < bulksize or tuning(store) is None:
+		yield
+		return
+	previous = tuning(store)
+	if isinstance(store, SQLiteStore):
+		tune(store, 'bulk')
+		store.drop_indexes()
+		try:
+			yield
+		finally:
+			store.create_indexes()
+			tune(store, previous)
+		return
+	engine = store.engine
+	indexes = [i for t in _sqltables for i in store.tables[t].indexes
+		if not i.unique]
+	tune(store, 'bulk')
+	with engine.begin() as connection:
+		for index in indexes:
+			index.drop(connection, checkfirst=True)
+	try:
+		yield
+	finally:
+		with engine.begin() as connection:
+			for index in indexes:
+				index.create(connection, checkfirst=True)
+			connection.execute(sqlalchemy.text('ANALYZE'))
+		tune(store, previous)
+
+
 def save_xml(g, filename, format='pretty-xml'):
 	"""Note: format must be `pretty-xml`, because xml omits triples!"""
 	xmlrdf = g.serialize(format=format)
@@ -24,5 +187,214 @@ def save_xml(g, filename, format='pretty-xml'):
 	xmlfile.close()
 	return 'Wrote {} lines of XML dump to {}.'.format(
 		len(xmlrdf.split('\n')), filename)
-	
-	
+
+
+# collects parsed statements and inserts them in batches
+class BatchSink(object):
+	"""Sink for rdflib's N-Triples parser. Received triples are
+	buffered and written to the target graph in batches of fixed size
+	by a single call of ``Graph.addN``, which stores like SQLAlchemy
+	execute within one transaction. If given, `callback` is called
+	with every batch of quads written."""
+	def __init__(self, g, size, report=None, callback=None):
+		self.graph = g
+		self.size = size
+		self.report = report
+		self.callback = callback
+		self.insert = g.addN
+		"""Function writing a batch of quads, ``Graph.addN`` by default."""
+		self.batch = []
+		self.count = 0
+
+	def triple(self, s, p, o):
+		self.batch.append((s, p, o, self.graph))
+		if len(self.batch) >= self.size:
+			self.flush()
+
+	def flush(self):
+		"""Writes buffered triples to the graph."""
+		if len(self.batch) > 0:
+			self.insert(self.batch)
+			if self.callback:
+				self.callback(self.batch)
+			self.count += len(self.batch)
+			self.batch = []
+			if self.report:
+				self.report(self.count)
+
+
+# N-Quads parser for streaming import
+class QuadsParser(ntriples.W3CNTriplesParser):
+	"""N-Quads parser handing statements over to its sink
+	as plain triples. Graph labels are dropped, so that all
+	statements end up in the graph being imported into."""
+	def parseline(self, bnode_context=None):
+		self.eat(ntriples.r_wspace)
+		if (not self.line) or self.line.startswith('#'):
+			return
+		subject = self.subject(bnode_context)
+		self.eat(ntriples.r_wspace)
+		predicate = self.predicate()
+		self.eat(ntriples.r_wspace)
+		obj = self.object(bnode_context)
+		self.eat(ntriples.r_wspace)
+		# graph label
+		self.uriref() or self.nodeid(bnode_context)
+		self.eat(ntriples.r_tail)
+		if self.line:
+			raise ntriples.ParseError('Trailing garbage: {}'.format(self.line))
+		self.sink.triple(subject, predicate, obj)
+
+
+# average size of n-triples lines in bytes, for estimating statement count
+_linesize = 100
+
+
+# import line-based rdf dump incrementally
+def stream_import(g, location, format='nt', batch=None, progress=True,
+	callback=None):
+	"""Reads N-Triples or N-Quads from a local file into the given graph
+	without holding more than one batch of statements in memory.
+	Statements are inserted in batches of `batch` triples (default:
+	:data:`batchsize`), each one in a single transaction. While importing,
+	throughput and the number of bytes read are printed.
+
+	:param format: either ``'nt'`` or ``'nquads'``
+	:param callback: function called with each batch of quads inserted
+	:returns: tuple ``(triples, bytes, seconds)``
+	"""
+	start = time.time()
+	raw = open(location, 'rb')
+	def report(count):
+		elapsed = max(time.time()-start, 1e-6)
+		print('{} triples, {:.1f} MB read, {:.0f} triples/s'.format(
+			count, raw.tell()/1024.**2, count/elapsed), end='\r')
+	sink = BatchSink(g, batch or batchsize, report=report if progress else None,
+		callback=callback)
+	parser = [ntriples.W3CNTriplesParser, QuadsParser][int(format == 'nquads')](
+		sink=sink)
+	try:
+		with bulk(g, os.path.getsize(location) // _linesize):
+			parser.parse(codecs.getreader('utf-8')(raw))
+			sink.flush()
+		size = raw.tell()
+	finally:
+		raw.close()
+	if progress:
+		print('')
+	return (sink.count, size, time.time()-start)
+
+
+# tell if graphs live in the same sql database
+def same_database(g1, g2):
+	"""Tells whether both graphs are kept in the same tables of the same
+	database by `rdflib_sqlalchemy` stores, or by
+	:class:`.sqlstore.SQLiteStore` instances, so that statements can be
+	copied from one to the other by the database itself (see
+	:func:`copy_sql`)."""
+	s1, s2 = (g1.store, g2.store)
+	if isinstance(s1, SQLiteStore) and isinstance(s2, SQLiteStore):
+		return s1 is s2 or (s1.database is not None and
+			s1.database == s2.database)
+	if not (isinstance(s1, SQLAlchemy) and isinstance(s2, SQLAlchemy)):
+		return False
+	if s1.engine is None or s2.engine is None:
+		return False
+	return str(s1.engine.url) == str(s2.engine.url) and all([
+		s1.tables[t].name == s2.tables[t].name for t in _sqltables])
+
+
+# copy statements within sql database
+def copy_sql(src, dst):
+	"""Copies all statements of graph `src` to graph `dst`, both of
+	which must live in the same database (see :func:`same_database`),
+	by one ``INSERT ... SELECT`` per table, in a single transaction.
+	Statements already in `dst` are skipped."""
+	store = dst.store
+	if isinstance(store, SQLiteStore):
+		store.copy_context(src.identifier, dst.identifier)
+		return
+	with store.engine.begin() as connection:
+		for name in _sqltables:
+			table = store.tables[name]
+			columns = [c for c in table.columns if c.name != 'id']
+			select = sqlalchemy.select([[c, sqlalchemy.literal(dst.identifier,
+				type_=c.type).label(c.name)][int(c.name == 'context')]
+				for c in columns]).where(table.c.context == src.identifier)
+			insert = table.insert().from_select(columns, select)
+			if store.engine.name == 'sqlite':
+				insert = insert.prefix_with('OR IGNORE')
+			connection.execute(insert)
+
+
+# insert quads into sql store using given connection
+def _sql_insert(store, connection, quads):
+	# group statements by table, like SQLAlchemy.addN does
+	commands = {}
+	for s, p, o, c in quads:
+		kind, statement, params = store._get_build_command((s, p, o), c,
+			isinstance(c, rdflib.graph.QuotedGraph))
+		commands.setdefault(kind, [statement, []])[1].append(params)
+	for statement, params in commands.values():
+		connection.execute(store._add_ignore_on_conflict(statement), params)
+
+
+# copy graph contents
+def copy(src, dst, batch=None, progress=False, callback=None):
+	"""Copies namespace bindings and statements of graph `src` to graph
+	`dst`, which may already contain statements. If both live in the same
+	database, this is left to the database (see :func:`copy_sql`).
+	Otherwise, statements are streamed from one store to the other in
+	batches of `batch` triples (default: :data:`batchsize`), each of which
+	is inserted by a single call of ``Graph.addN``. Nothing is serialized
+	or parsed. If `dst` is kept in an SQL database, all batches are
+	inserted within one transaction, so that a failing copy leaves it
+	unchanged.
+
+	:param progress: print number of triples copied and throughput
+	:param callback: function called with each batch of quads inserted,
+		or, if they are inserted within one transaction, with graph `src`
+		once the transaction has been committed
+	:returns: tuple ``(triples, seconds, method)``, where `triples` is
+		the number of statements `dst` has gained, and `method` is either
+		``'sql'`` or ``'stream'``
+	"""
+	start = time.time()
+	before = len(dst)
+	for prefix, url in src.namespaces():
+		dst.bind(prefix, url)
+	if same_database(src, dst):
+		with bulk(dst, len(src)):
+			copy_sql(src, dst)
+		return (len(dst)-before, time.time()-start, 'sql')
+	def report(count):
+		elapsed = max(time.time()-start, 1e-6)
+		print('{} triples, {:.0f} triples/s'.format(count, count/elapsed),
+			end='\r')
+	sink = BatchSink(dst, batch or batchsize,
+		report=report if progress else None, callback=callback)
+	store = dst.store
+	transaction = None
+	if isinstance(store, SQLiteStore):
+		transaction, insert = (store.transaction, store.insert)
+	elif isinstance(store, SQLAlchemy) and store.engine is not None:
+		transaction = store.engine.begin
+		insert = lambda connection, quads: _sql_insert(store, connection, quads)
+	if transaction:
+		# nothing is reported as added unless the transaction succeeds
+		sink.callback = None
+		with bulk(dst, len(src)):
+			with transaction() as connection:
+				sink.insert = lambda quads: insert(connection, quads)
+				for s, p, o in src:
+					sink.triple(s, p, o)
+				sink.flush()
+		if callback and sink.count > 0:
+			callback(src)
+	else:
+		for s, p, o in src:
+			sink.triple(s, p, o)
+		sink.flush()
+	if progress and sink.count > 0:
+		print('')
+	return (len(dst)-before, time.time()-start, 'stream')
@@ -25,11 +25,16 @@ __docformat__ = "restructuredtext en"
 __version__ = "0.0.24-dev"
 __all__ = ['prompt', 'highlights', 'complete', 'run']
 
+import time
 import readline
 
 from . import prompt
 from kathaireo import rdf, commands, util
 
+# completion candidates computed for the most recent key:
+# (line buffer, cursor range, versions of registries and graphs)
+_completion = {'key': None, 'choices': []}
+
 
 def complete(input, state):
 	"""Performs generic autocompletion action for whatever incomplete
@@ -43,6 +48,11 @@ def complete(input, state):
 	This list of candidate terms is put together by the :func:`~.commands.choices_left`
 	function in the :mod:`.commands` module. Read its documentation for
 	more information.
+
+	Since `readline` calls this function once per candidate (`state`),
+	the list is computed only once per line buffer, cursor range and
+	state of the command, namespace and graph registries. The time it
+	takes is logged.
 	"""
 	# http://stackoverflow.com/a/5638688/1933494
 	buf = readline.get_line_buffer()
@@ -52,10 +62,18 @@ def complete(input, state):
 	#sgst = [s+' ' for s in commands.choices_left(buf)]
 	# range from position of currently handled term to that of cursor
 	csrng = (readline.get_begidx(), readline.get_endidx())
-	util.log('User input line: "{}"; current range {}'.format(buf, csrng))
-	#print '{}-{}'.format(*csrng)
-	sgst = [s for s in commands.choices_left(buf, csrng)]
-	return sgst[state]
+	key = (buf, csrng, commands.version, rdf.ns.version, rdf.version)
+	if key != _completion.get('key'):
+		util.log('User input line: "{}"; current range {}'.format(buf, csrng))
+		start = time.time()
+		_completion['choices'] = [s for s in commands.choices_left(buf, csrng)]
+		_completion['key'] = key
+		util.log('Completion took {:.1f} ms ({} candidates).'.format(
+			(time.time()-start)*1000, len(_completion['choices'])))
+	sgst = _completion['choices']
+	if state < len(sgst):
+		return sgst[state]
+	return None
 
 
 
@@ -84,6 +102,8 @@ def run():
 		readline.redisplay()
 		output = commands.execute(line)
 		prompt.display(output)
+		# commands may change what can be completed
+		_completion['key'] = None
 
 
 
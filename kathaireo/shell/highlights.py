@@ -6,6 +6,7 @@ Syntax highlighting.
 __docformat__ = "restructuredtext en"
 
 import re
+import sys
 import os.path
 from random import randrange as rnd
 
@@ -65,6 +66,20 @@ _colscheme = {
 _rexorder = [errex, wrnex, bldex, qutex, angex, urlex,
 			sqrex, nmrex, flnex, keyex]
 
+# all of the above, combined into one scanner. alternatives are
+# tried in order, so the group matching a token at its beginning is
+# the one of the first regex in _rexorder which would match it
+_scanner = re.compile('|'.join(['(?P<r{}>{})'.format(i,
+	['{}', '(?i:{})'][int(bool(rex.flags & re.I))].format(rex.pattern))
+	for i, rex in enumerate(_rexorder)]))
+
+cachesize = 10000
+"""Maximum number of tokens whose highlighted representation is
+remembered by :func:`hilite`."""
+
+# highlighted tokens; key None holds namespace registry version
+_hilites = {}
+
 #print '\n'.join(['{}:{}'.format(k.pattern,v)
 	#for k,v in _colscheme.items()])
 
@@ -134,49 +149,50 @@ def hilite(token):
 	Based on a list of regular expressions, a given character
 	sequence (e.g. a single word) is optionally equipped with
 	text formatting/coloring control sequences.
+	All expressions are tried at once by a combined scanner, and
+	results are remembered until another namespace is registered.
 	TODO: specify hilite conditions/hilites/regexes
 	"""
-	#cid = rnd(13)
-	#return '{}'.format(color(cid)+token+color(0))
-	#
-	#rexorder = _rexorder[:]
-	#rexorder.insert(5,re.compile('({})'.format(
-		#'|'.join(namespaces.get_names()))))
-	for rex in _rexorder:
-		if rex.match(token):
-			cid = _colscheme.get(rex)
-			if hasattr(cid, '__len__'):
-				cid = u''.join([color(i) for i in cid])
-			else:
-				cid = color(cid)
-			# error and warning markups must be removed
-			if rex in [wrnex, errex, bldex]:
-				if rex is errex:
-					i = 2
-				else:
-					i = 1
-				token = u'{}{}{}{}'.format(
-					cid, token[i:-i], color(0), color(stdcol))
-			# if filename matches, check if such file exists
-			elif rex is flnex:
-				if not(os.path.exists(token)
-					and os.path.isfile(token)):
-					cid = color(7)
-					continue
-			return u'{}'.format(cid+token+color(0)+color(stdcol))
-		else:
-			# hilight ns:term clauses
-			fields = token.split(':',1)
-			if len(fields)<2:
-				fields.append(None)
-			nsn, term = fields
-			if nsn in namespaces._namespaces:
-				if term == None or re.match('[a-z][a-z0-9_-]*', term, re.I):
-					token = u'{}{}{}'.format(color(8), token, color(0))
-					continue
-	return u'{}'.format(token)
+	if _hilites.get(None) != namespaces.version or len(_hilites) > cachesize:
+		_hilites.clear()
+		_hilites[None] = namespaces.version
+	res = _hilites.get(token)
+	if res is None:
+		res = _hilite(token)
+		_hilites[token] = res
+	return res
+
+
+# find and apply highlight for token
+def _hilite(token):
+	match = _scanner.match(token)
+	rex = None
+	if match:
+		rex = _rexorder[int(match.lastgroup[1:])]
+	# hilight ns:term clauses, unless token is an error message
+	if rex is not errex:
+		nsn, _, term = token.partition(':')
+		if nsn in namespaces._namespaces:
+			if not term or re.match('[a-z][a-z0-9_-]*', term, re.I):
+				return u'{}{}{}'.format(color(8), token, color(0))
+	# if filename matches, check if such file exists
+	if rex is flnex and not os.path.isfile(token):
+		rex = [None, keyex][int(bool(keyex.match(token)))]
+	if rex is None:
+		return token
+	cid = _colscheme.get(rex)
+	if hasattr(cid, '__len__'):
+		cid = u''.join([color(i) for i in cid])
+	else:
+		cid = color(cid)
+	# error and warning markups must be removed
+	if rex in [wrnex, errex, bldex]:
+		i = [1, 2][int(rex is errex)]
+		return u'{}{}{}{}'.format(cid, token[i:-i], color(0), color(stdcol))
+	return u'{}'.format(cid+token+color(0)+color(stdcol))
 
 
 ########
 stdcol=0
-print(u'{}\r'.format(color(stdcol)), end = '')
+if sys.stdout.isatty():
+	print(u'{}\r'.format(color(stdcol)), end = '')
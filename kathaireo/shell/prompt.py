@@ -9,6 +9,8 @@ __docformat__ = "restructuredtext en"
 __version__ = "0.0.18-dev"
 
 import re
+import sys
+import shutil
 
 from .highlights import color, hilite, col_demo, stdcol
 from kathaireo import rdf
@@ -19,6 +21,25 @@ from ..util import urlex, log
 PS = "{}\001\033[32m\002[{}{{}}{}] {}{}".format(
 	color(0), color(7), color(5), color(23), color(1))
 
+pager = True
+"""If set, output longer than the terminal's height is displayed
+page by page, as long as stdout is a terminal."""
+
+chunksize = 256
+"""Number of lines written to stdout at once."""
+
+highlighting = None
+"""If `True`, output is color-coded, if `False`, it's printed as is.
+By default (`None`), output is color-coded only if stdout is a
+terminal."""
+
+cachesize = 10000
+"""Maximum number of URIs whose replacements are remembered by
+:func:`shorten`."""
+
+# replacements for uris; key None holds namespace registry version
+_qnames = {}
+
 # tokenizer regex
 # TODO: is this redundant?
 #_tokex = re.compile('(\"[^\"]*?\"|\'[^\']*?\'|[ ,]+|\S*|\w*|<[^>]*?>|.*)')
@@ -65,34 +86,40 @@ def tokenize(line):
 	contain those within quotation marks, angle or square brackets, text
 	representing numeric (decimal) values and single words marked for emphasizing
 	with surrounding ``*`` or ``!``.
+	URIs are replaced by ``ns:term`` clauses beforehand, in a single
+	pass over the line (see :func:`shorten`).
 	:param line: single line of text to be printed to stdout
 	:returns: list of single tokens
 	"""
 	# replace url locators by ns:term clauses.
-	uris = urlex.findall(line)
-	for uri in uris:
-		#print '\ntry to format:', ''.join(uri)
-		#print '\t', ''.join(['<{}>'.format(u) for u in uri])
-		#if uri[0].startswith('file://'):
-			#uri = uri[1:]
-		#TODO: wahrscheinlich unnoetig:
-		#genauso gut kann der rdflib namespacemanager eingesetzt werden
-		#https://rdflib.readthedocs.org/en/latest/utilities.html#serializing-a-single-term-to-n3
-		uri = ''.join(uri)
-		url, term = rdf.struct_uri(uri) #FIXME nein!
-		log('Prompt output: Split uri {} into "..{}", "{}".'.format(uri,
-			url[-10:], term))
-		#print u'\tfiltererd output: {} ending on "{}"'.format(url, term)
+	line = urlex.sub(shorten, line)
+	# tokenize
+	return [t for t in _tokex.split(line) if t]
+
+
+# substitute ns:term clause for uri matched by urlex
+def shorten(match):
+	"""Returns the replacement for a URI matched by
+	:data:`..util.urlex`: a ``ns:term`` clause if the URI lies within
+	a known namespace, or an abbreviation marked as a warning if it
+	ends without a term. Replacements are remembered until another
+	namespace is registered."""
+	uri = ''.join([g or '' for g in match.groups()])
+	if _qnames.get(None) != rdf.ns.version or len(_qnames) > cachesize:
+		_qnames.clear()
+		_qnames[None] = rdf.ns.version
+	res = _qnames.get(uri)
+	if res is None:
+		res = uri
+		url, term = rdf.struct_uri(uri)
 		if term:
-			nsp = rdf.ns.get_ns(url)
+			nsp, term = rdf.ns.split(uri)
 			if nsp:
-				log('substitute with {}:{}'.format(nsp.name, term))
-				#print u'\tnamespace:', nsp.name, nsp.url
-				line = line.replace(uri, u'{}:{}'.format(nsp.name, term)) #FIXME: nicht hier!
+				res = u'{}:{}'.format(nsp.name, term)
 		else:
-			line = line.replace(uri, u'!{}..{}!'.format(uri[:20],uri[-20:])) #TODO: ok, vielleicht
-	# tokenize
-	return _tokex.split(line)
+			res = u'!{}..{}!'.format(uri[:20],uri[-20:]) #TODO: ok, vielleicht
+		_qnames[uri] = res
+	return res + match.group(0)[len(uri):]
 
 
 def display(output):
@@ -100,21 +127,75 @@ def display(output):
 	Print a given output message to stdout (active shell) linewise.
 	Tokenizes each line in message and passes single tokens
 	to :func:`.highlights.hilite` before reassemblage of resulting,
-	possibly color-coded text parts.
+	possibly color-coded text parts. Colors are left out if stdout isn't
+	a terminal, unless :data:`highlighting` says otherwise, but URIs are
+	shortened to ``ns:term`` clauses either way.
+	Lines are written to stdout in chunks of :data:`chunksize`. When
+	stdout is a terminal and :data:`pager` is set, output stops after
+	each screenful of lines and waits for the user to ask for more.
 	:param output: output message to be printed. Can be either one
-	single string variable (linebreaks will be interpreted) or a
-	list of strings (linebreaks are ignored). Unicode is preferred.
+	single string variable (linebreaks will be interpreted), a
+	list of strings or any other iterator over strings, such as a
+	generator returned by a command handler (linebreaks are ignored).
+	Lines produced by a generator are printed as they come in.
+	Unicode is preferred.
 	"""
-	# prefer list of strings, so try to force content into one
+	# prefer sequence of strings, so try to force content into one
 	if type(output) != str:
-		if type(output) is not list:
+		if not (type(output) is list or _is_iterator(output)):
 			output = u'{}'.format(output)
 	if type(output) is str:
 		output = output.split('\n')
-	# colorize single tokens
+	tty = sys.stdout.isatty()
+	paging = pager and tty
+	colored = highlighting or (highlighting is None and tty)
+	pagesize = max(shutil.get_terminal_size().lines - 1, 1)
+	buf = []
+	count = 0
 	for item in output:
 		line = u'{}'.format(item)
-		tokens = tokenize(line)
-		print(''.join([hilite(t) for t in tokens]))
+		# colorize single tokens
+		if colored:
+			line = ''.join([hilite(t) for t in tokenize(line)])
+		else:
+			line = urlex.sub(shorten, line)
+		buf.append(line)
+		count += 1
+		if paging and count % pagesize == 0:
+			_write(buf)
+			answer = _more()
+			if answer == 'q':
+				break
+			# don't stop again for the rest of this output
+			paging = answer != 'a'
+		elif len(buf) >= chunksize:
+			_write(buf)
+	_write(buf)
+	sys.stdout.flush()
+
+
+# tell generators and such from strings and other objects
+def _is_iterator(output):
+	try:
+		return iter(output) is output
+	except TypeError:
+		return False
+
+
+# write buffered lines to stdout at once
+def _write(buf):
+	if len(buf) > 0:
+		sys.stdout.write(u'\n'.join(buf)+u'\n')
+		del buf[:]
 
 
+# ask user whether to continue paged output
+def _more():
+	sys.stdout.flush()
+	try:
+		answer = input('{}-- more -- (enter: next page, a: all, q: quit){} '.format(
+			color(3), color(0)))
+	except (EOFError, KeyboardInterrupt):
+		print('')
+		return 'q'
+	return answer.strip().lower()[:1]
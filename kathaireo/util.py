@@ -5,6 +5,7 @@
 __docformat__ = "restructuredtext en"
 __version__ = "0.0.24-dev"
 
+import os
 import re
 import logging
 
@@ -28,4 +29,7 @@ urlex = re.compile(''.join([
 
 logging.basicConfig(filename='.kathaireo.log', level=logging.DEBUG,
 	format='%(asctime)s %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
-log=logging.info
\ No newline at end of file
+log=logging.info
+
+# location of persistent session data (caches etc.)
+datadir = os.path.join(os.path.expanduser('~'), '.kathaireo')